@@ -3,57 +3,209 @@
 #----------------------------------------------------------------------------#
 
 import json
+import os
 import dateutil.parser
+import dateutil.rrule
 import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+import babel.dates
+from flask import Flask, Blueprint, current_app, render_template, request, Response, flash, redirect, url_for, abort, jsonify
 from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
 import logging
 from logging import Formatter, FileHandler
 from flask_wtf import Form
 from forms import *
+from suggest import PrefixIndex
+from matchmaking import Codes, MatchIndex
+from cache import PageCache
+import profiler
+from metrics import Registry, TIME_BUCKETS, COUNT_BUCKETS, SIZE_BUCKETS
+import importer
+import click
 from flask_migrate import Migrate
-from sqlalchemy import func,text
+from jinja2 import FileSystemBytecodeCache
+from sqlalchemy import func,text,event,orm
+from sqlalchemy.engine import Engine
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.schema import Computed, DDL
+import re
+from flask import g, has_request_context, session, make_response, stream_with_context, before_render_template, template_rendered
+from functools import wraps
+import hashlib
+import time
+import weakref
+from itertools import groupby, islice
+from collections import Counter
 from enum import Enum
-from datetime import datetime
+from datetime import datetime, timedelta
 import pytz
+try:
+  import orjson
+except ImportError:
+  orjson = None
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
 
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
-db = SQLAlchemy(app)
+class RoutingSession(SignallingSession):
+  # Statements of a read-only view go to the 'replica' bind when there is
+  # one; everything else, and any flush, goes to the primary.
+  def get_bind(self, mapper=None, clause=None):
+    if (has_request_context() and g.get('read_only') and not self._flushing
+        and 'replica' in (self.app.config['SQLALCHEMY_BINDS'] or ())):
+      return db.get_engine(self.app, bind='replica')
+    return SignallingSession.get_bind(self, mapper, clause)
 
-# TODO: connect to a local postgresql database
-migrate = Migrate(app,db)
+class RoutingSQLAlchemy(SQLAlchemy):
+  def create_session(self, options):
+    return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+# Extensions are bound to an app by create_app() below.
+db = RoutingSQLAlchemy()
+moment = Moment()
+migrate = Migrate()
+page_cache = PageCache()
+request_profiler = profiler.Profiler()
+
+# Every route, hook, filter and command lives on this blueprint.
+main = Blueprint('main', __name__, cli_group=None)
+
+#----------------------------------------------------------------------------#
+# Request metrics.
+#----------------------------------------------------------------------------#
+
+# Every statement issued while serving a request bumps g.query_count and adds
+# its duration to g.sql_time, so we can check that a view's query count stays
+# constant as the data grows. Per endpoint, the totals land in histograms
+# served by /metrics.
+metrics = Registry()
+request_seconds = metrics.histogram('fyyur_request_seconds', 'Time spent serving the request.', TIME_BUCKETS)
+request_queries = metrics.histogram('fyyur_request_queries', 'SQL statements issued per request.', COUNT_BUCKETS)
+sql_seconds = metrics.histogram('fyyur_sql_seconds', 'Time spent in SQL per request.', TIME_BUCKETS)
+render_seconds = metrics.histogram('fyyur_render_seconds', 'Time spent rendering templates per request.', TIME_BUCKETS)
+response_bytes = metrics.histogram('fyyur_response_bytes', 'Size of the response body.', SIZE_BUCKETS)
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def count_query(conn, cursor, statement, parameters, context, executemany):
+  if has_request_context():
+    g.query_count = g.get('query_count', 0) + 1
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def time_query(conn, cursor, statement, parameters, context, executemany):
+  started = conn.info.get('query_started')
+  if started and has_request_context():
+    g.sql_time = g.get('sql_time', 0.0) + time.perf_counter() - started.pop()
+
+@event.listens_for(Engine, 'handle_error')
+def drop_query_timer(context):
+  if context.connection is None or not has_request_context():
+    return
+  started = context.connection.info.get('query_started')
+  if started:
+    started.pop()
+
+@before_render_template.connect
+def start_render_timer(sender, template, context, **extra):
+  g.render_started = time.perf_counter()
+
+@template_rendered.connect
+def stop_render_timer(sender, template, context, **extra):
+  g.render_time = g.get('render_time', 0.0) + time.perf_counter() - g.pop('render_started', time.perf_counter())
+
+@main.before_app_request
+def start_request_timer():
+  # g outlives the request when an app context was pushed around it (the CLI,
+  # scripts), so start every request from zero
+  g.query_count = 0
+  g.sql_time = g.render_time = 0.0
+  g.request_started = time.perf_counter()
+
+def observe_request(app, state, method, path, endpoint, size):
+  # state is the g of the request, read once its response is complete
+  count = state.get('query_count', 0)
+  app.logger.debug('%s %s ran %d queries', method, path, count)
+  budget = app.config.get('QUERY_BUDGET')
+  if budget is not None and count > budget:
+    app.logger.warning('%s %s (%s) ran %d queries, over the budget of %d',
+                       method, path, endpoint, count, budget)
+  if 'request_started' in state:
+    request_seconds.observe(endpoint, time.perf_counter() - state.request_started)
+  request_queries.observe(endpoint, count)
+  sql_seconds.observe(endpoint, state.get('sql_time', 0.0))
+  render_seconds.observe(endpoint, state.get('render_time', 0.0))
+  response_bytes.observe(endpoint, size)
+
+def observe_stream(body, charset, *request_args):
+  # A streamed body runs its queries and renders while it is sent, after the
+  # request hooks, so it is observed when it ends (or the client goes away).
+  size = 0
+  try:
+    for chunk in body:
+      if isinstance(chunk, str):
+        chunk = chunk.encode(charset)
+      size += len(chunk)
+      yield chunk
+  finally:
+    if hasattr(body, 'close'):
+      body.close()
+    observe_request(*request_args, size)
+
+@main.after_app_request
+def record_query_count(response):
+  request_args = (current_app._get_current_object(), g._get_current_object(),
+                  request.method, request.path, request.endpoint or 'unmatched')
+  if response.is_streamed:
+    # no X-Query-Count: the headers leave before the body's queries run
+    response.response = observe_stream(response.response, response.charset, *request_args)
+    return response
+  if current_app.config.get('QUERY_COUNT_HEADER'):
+    response.headers['X-Query-Count'] = str(g.get('query_count', 0))
+  observe_request(*request_args, response.calculate_content_length() or 0)
+  return response
 
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
-sh_art = db.Table('sh_art',
-    db.Column('shows_id', db.Integer, db.ForeignKey('Shows.id'), primary_key=True),
-    db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id'), primary_key=True)
-)
+# Venues and artists carry a generated, GIN-indexed search document: name
+# (weight A), city and state (B) and genres (C). fyyur_array_text is an
+# IMMUTABLE array_to_string so the genres can take part in a stored column.
+SEARCH_VECTOR = ("setweight(to_tsvector('simple', name), 'A') || "
+                 "setweight(to_tsvector('simple', city || ' ' || state), 'B') || "
+                 "setweight(to_tsvector('simple', fyyur_array_text(genres)), 'C')")
 
-sh_ven = db.Table('sh_ven',
-    db.Column('shows_id', db.Integer, db.ForeignKey('Shows.id'), primary_key=True),
-    db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id'), primary_key=True)
-)
+event.listen(db.Model.metadata, 'before_create', DDL(
+  "CREATE OR REPLACE FUNCTION fyyur_array_text(text[]) RETURNS text "
+  "LANGUAGE sql IMMUTABLE AS $$ SELECT array_to_string($1, ' ') $$"))
 
 class Shows(db.Model):
+  # Partitioned by start_time, one partition per year ("Shows_2026") and
+  # "Shows_default" for years without one (see Show partitions); the
+  # partition key has to be part of the primary key and of the external_id key.
   __tablename__ = "Shows"
-  id = db.Column(db.Integer, primary_key=True)
-  artists = db.relationship('Artist', secondary=sh_art,backref=db.backref('shows', lazy=True))
-  venues = db.relationship('Venue', secondary=sh_ven, backref=db.backref('shows', lazy=True))
-  start_time = db.Column(db.DateTime(timezone=True), nullable=False)
+  id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+  external_id = db.Column(db.String())
+  # Deleting a venue or artist deletes its shows in the database, in the same
+  # statement; passive_deletes keeps the ORM from loading them first.
+  artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), nullable=False)
+  venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), nullable=False)
+  artist = db.relationship('Artist', backref=db.backref('shows', lazy=True, passive_deletes=True))
+  venue = db.relationship('Venue', backref=db.backref('shows', lazy=True, passive_deletes=True))
+  start_time = db.Column(db.DateTime(timezone=True), primary_key=True)
+  series_id = db.Column(db.Integer, db.ForeignKey('ShowSeries.id', ondelete='CASCADE'), index=True)
+  updated_at = db.Column(db.DateTime(timezone=True), nullable=False, server_default=func.now(), default=func.now(), onupdate=func.now())
+  __table_args__ = (db.UniqueConstraint('external_id', 'start_time'),
+                    db.Index('ix_Shows_start_time_id', 'start_time', 'id'),
+                    db.Index('ix_Shows_venue_id_start_time', 'venue_id', 'start_time'),
+                    db.Index('ix_Shows_artist_id_start_time', 'artist_id', 'start_time'),
+                    {'postgresql_partition_by': 'RANGE (start_time)'})
 
 
 class Venue(db.Model):
   __tablename__ = "Venue"
   id = db.Column(db.Integer, primary_key=True)
+  external_id = db.Column(db.String(), unique=True)
   name = db.Column(db.String(), nullable=False)
   city = db.Column(db.String(), nullable=False)
   state = db.Column(db.String(), nullable=False)
@@ -65,11 +217,22 @@ class Venue(db.Model):
   website = db.Column(db.String())
   seeking_talent = db.Column(db.Boolean, default=False, nullable=False)
   seeking_description = db.Column(db.String())
+  updated_at = db.Column(db.DateTime(timezone=True), nullable=False, server_default=func.now(), default=func.now(), onupdate=func.now())
+  upcoming_shows_count = db.Column(db.Integer, nullable=False, server_default='0')
+  past_shows_count = db.Column(db.Integer, nullable=False, server_default='0')
+  # when a show of it, or the name or image of the other side of one, last
+  # changed (see touch_show_pages and the count triggers)
+  shows_changed_at = db.Column(db.DateTime(timezone=True), nullable=False, server_default=func.now())
+  search_vector = db.Column(TSVECTOR, Computed(SEARCH_VECTOR, persisted=True))
+  __table_args__ = (db.Index('ix_Venue_search_vector', 'search_vector', postgresql_using='gin'),
+                    db.Index('ix_Venue_genres', 'genres', postgresql_using='gin'),
+                    db.Index('ix_Venue_name_id', 'name', 'id'))
 
 
 class Artist(db.Model):
   __tablename__ = "Artist"
   id = db.Column(db.Integer, primary_key=True)
+  external_id = db.Column(db.String(), unique=True)
   name = db.Column(db.String(), nullable=False)
   city = db.Column(db.String(), nullable=False)
   state = db.Column(db.String(), nullable=False)
@@ -80,7 +243,74 @@ class Artist(db.Model):
   website = db.Column(db.String())
   seeking_venue = db.Column(db.Boolean, default=False, nullable=False)
   seeking_description = db.Column(db.String())
+  updated_at = db.Column(db.DateTime(timezone=True), nullable=False, server_default=func.now(), default=func.now(), onupdate=func.now())
+  upcoming_shows_count = db.Column(db.Integer, nullable=False, server_default='0')
+  past_shows_count = db.Column(db.Integer, nullable=False, server_default='0')
+  # when a show of it, or the name or image of the other side of one, last
+  # changed (see touch_show_pages and the count triggers)
+  shows_changed_at = db.Column(db.DateTime(timezone=True), nullable=False, server_default=func.now())
+  search_vector = db.Column(TSVECTOR, Computed(SEARCH_VECTOR, persisted=True))
+  __table_args__ = (db.Index('ix_Artist_search_vector', 'search_vector', postgresql_using='gin'),
+                    db.Index('ix_Artist_genres', 'genres', postgresql_using='gin'),
+                    db.Index('ix_Artist_name_id', 'name', 'id'))
+
+
+class ShowSeries(db.Model):
+  # A recurring show: an RFC 5545 recurrence rule (e.g. "FREQ=WEEKLY;COUNT=52")
+  # from start_time on. Its dates are expanded into Shows rows when it is
+  # created, and deleting the series deletes them.
+  __tablename__ = "ShowSeries"
+  id = db.Column(db.Integer, primary_key=True)
+  artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), nullable=False)
+  venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), nullable=False)
+  start_time = db.Column(db.DateTime(timezone=True), nullable=False)
+  rule = db.Column(db.String(), nullable=False)
+
+
+class ShowClock(db.Model):
+  # Single row. The show counters of Venue and Artist count a show as upcoming
+  # when it starts after rolled_at; roll_show_counts() moves it forward.
+  # shows_changed_at is the version of the /shows feed.
+  __tablename__ = "show_clock"
+  id = db.Column(db.Integer, primary_key=True)
+  rolled_at = db.Column(db.DateTime(timezone=True), nullable=False)
+  shows_changed_at = db.Column(db.DateTime(timezone=True), nullable=False, server_default=func.now())
+
+
+# upcoming_shows_count / past_shows_count follow every INSERT, UPDATE and
+# DELETE on Shows through statement-level triggers, one UPDATE per table per
+# statement however many shows it touched (bulk imports included). They also
+# move the versions of the feed and of the venues and artists concerned.
+# Updating the clock row first makes them wait for a roll in progress, and
+# orders show writers before they lock any venue or artist.
+SHOW_COUNT_DELTA = (
+  'UPDATE "{table}" t SET upcoming_shows_count = upcoming_shows_count {sign} d.upcoming, '
+  'past_shows_count = past_shows_count {sign} d.past, shows_changed_at = clock_timestamp() '
+  'FROM (SELECT {fk} AS id, count(*) FILTER (WHERE start_time > rolled) AS upcoming, '
+  'count(*) FILTER (WHERE start_time <= rolled) AS past FROM {rows} GROUP BY {fk}) d '
+  'WHERE t.id = d.id;')
+
+def show_count_deltas(sign, rows):
+  return ' '.join(SHOW_COUNT_DELTA.format(table=table, fk=fk, sign=sign, rows=rows)
+                  for table, fk in (('Venue', 'venue_id'), ('Artist', 'artist_id')))
 
+event.listen(db.Model.metadata, 'after_create', DDL(
+  "INSERT INTO show_clock (id, rolled_at) VALUES (1, now()); "
+  'CREATE TABLE "Shows_default" PARTITION OF "Shows" DEFAULT; '
+  "CREATE OR REPLACE FUNCTION fyyur_count_shows() RETURNS trigger LANGUAGE plpgsql AS $$ "
+  "DECLARE rolled timestamptz; "
+  "BEGIN "
+  "UPDATE show_clock SET shows_changed_at = clock_timestamp() WHERE id = 1 RETURNING rolled_at INTO rolled; "
+  "IF TG_OP IN ('DELETE', 'UPDATE') THEN " + show_count_deltas('-', 'old_rows') + " END IF; "
+  "IF TG_OP IN ('INSERT', 'UPDATE') THEN " + show_count_deltas('+', 'new_rows') + " END IF; "
+  "RETURN NULL; "
+  "END $$; "
+  'CREATE TRIGGER "Shows_count_insert" AFTER INSERT ON "Shows" REFERENCING NEW TABLE AS new_rows '
+  "FOR EACH STATEMENT EXECUTE FUNCTION fyyur_count_shows(); "
+  'CREATE TRIGGER "Shows_count_update" AFTER UPDATE ON "Shows" REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows '
+  "FOR EACH STATEMENT EXECUTE FUNCTION fyyur_count_shows(); "
+  'CREATE TRIGGER "Shows_count_delete" AFTER DELETE ON "Shows" REFERENCING OLD TABLE AS old_rows '
+  "FOR EACH STATEMENT EXECUTE FUNCTION fyyur_count_shows()"))
 
 # TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
 
@@ -88,21 +318,738 @@ class Artist(db.Model):
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format)
+DATETIME_FORMATS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma"
+}
+
+# (format, locale) -> (compiled babel pattern, babel Locale), built once per
+# worker instead of on every call.
+datetime_patterns = {}
+
+def datetime_pattern(format, locale):
+  key = (format, locale)
+  if key not in datetime_patterns:
+    datetime_patterns[key] = (babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format)),
+                              babel.Locale.parse(locale))
+  return datetime_patterns[key]
+
+def format_datetime(value, format='medium', locale=None):
+  # Takes the datetime values the queries return; strings are still parsed.
+  if isinstance(value, str):
+    value = dateutil.parser.parse(value)
+  if value.tzinfo is None:
+    value = value.replace(tzinfo=pytz.UTC)
+  locale = locale or babel.dates.LC_TIME
+  if format in ('short', 'long'):
+    return babel.dates.format_datetime(value, format, locale=locale)
+  pattern, locale = datetime_pattern(format, locale)
+  return pattern.apply(value, locale)
+
+main.add_app_template_filter(format_datetime, 'datetime')
+
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+def json_default(value):
+  if isinstance(value, datetime):
+    return value.isoformat()
+  raise TypeError('%r is not JSON serializable' % (value,))
+
+def dumps(value):
+  # compact JSON for the API; orjson (optional) is several times faster
+  if orjson is not None:
+    return orjson.dumps(value).decode()
+  return json.dumps(value, separators=(',', ':'), default=json_default)
+
+def upcoming_shows():
+  # Shows starting after the show clock. Postgres compares the clock once per
+  # query and skips the partitions of Shows that end before it.
+  return Shows.start_time > db.session.query(ShowClock.rolled_at).filter_by(id=1).as_scalar()
+
+def load_shows(entity_fk, entity_id, other, other_fk, prefix, upcoming_only=False):
+  # Shows of one venue/artist together with the artist/venue on the other
+  # side, in a single joined query. Postgres flags each show as upcoming or
+  # past, by the same clock as the show counters so that the lists match them,
+  # and nothing is lazy-loaded or compared in Python. upcoming_only leaves
+  # the past years out of the query.
+  upcoming = upcoming_shows()
+  rows = db.session.query(other.id, other.name, other.image_link, Shows.start_time, upcoming.label('upcoming')) \
+    .select_from(Shows) \
+    .join(other, other.id == other_fk) \
+    .filter(entity_fk == entity_id) \
+    .order_by(Shows.start_time)
+  if upcoming_only:
+    rows = rows.filter(upcoming)
+  data = {
+    "past_shows": [],
+    "upcoming_shows": []
+  }
+  for r in rows:
+    kind = 'upcoming' if r.upcoming else 'past'
+    data[kind + "_shows"].append({
+      prefix + "_id": r.id,
+      prefix + "_name": r.name,
+      prefix + "_image_link": r.image_link,
+      "start_time": r.start_time
+    })
+  return data
+
+# Fields of the venue and artist pages (and of the JSON API objects).
+VENUE_FIELDS = ('id', 'name', 'genres', 'address', 'city', 'state', 'phone', 'website',
+                'facebook_link', 'seeking_talent', 'seeking_description', 'image_link',
+                'upcoming_shows_count', 'past_shows_count')
+ARTIST_FIELDS = ('id', 'name', 'genres', 'city', 'state', 'phone', 'website',
+                 'facebook_link', 'seeking_venue', 'seeking_description', 'image_link',
+                 'upcoming_shows_count', 'past_shows_count')
+SHOW_LIST_FIELDS = ('past_shows', 'upcoming_shows')
+SHOW_FIELDS = ('id', 'start_time', 'artist_id', 'artist_name', 'artist_image_link', 'venue_id', 'venue_name')
+
+def entity_detail(model, entity_id, fields, entity_fk, other, other_fk, prefix):
+  # The requested columns of one venue/artist, plus its shows (load_shows)
+  # only when a show field is asked for. 404s for an unknown id.
+  columns = [getattr(model, f) for f in fields if f not in SHOW_LIST_FIELDS]
+  row = db.session.query(*(columns or [model.id])).filter(model.id == entity_id).first()
+  if row is None:
+    abort(404)
+  data = row._asdict() if columns else {}
+  if any(f in SHOW_LIST_FIELDS for f in fields):
+    shows = load_shows(entity_fk, entity_id, other, other_fk, prefix,
+                       upcoming_only='past_shows' not in fields)
+    data.update((f, shows[f]) for f in fields if f in SHOW_LIST_FIELDS)
+  return data
+
+def venue_detail(venue_id, fields=VENUE_FIELDS + SHOW_LIST_FIELDS):
+  return entity_detail(Venue, venue_id, fields, Shows.venue_id, Artist, Shows.artist_id, 'artist')
+
+def artist_detail(artist_id, fields=ARTIST_FIELDS + SHOW_LIST_FIELDS):
+  return entity_detail(Artist, artist_id, fields, Shows.artist_id, Venue, Shows.venue_id, 'venue')
+
+def shows_query():
+  # Shows joined with the artist and venue columns the feed displays.
+  return db.session.query(Shows.id, Shows.start_time,
+                          Artist.id.label('artist_id'), Artist.name.label('artist_name'),
+                          Artist.image_link.label('artist_image_link'),
+                          Venue.id.label('venue_id'), Venue.name.label('venue_name')) \
+    .join(Artist, Artist.id == Shows.artist_id) \
+    .join(Venue, Venue.id == Shows.venue_id)
+
+def encode_cursor(row):
+  # Opaque keyset cursor for the /shows feed: "<start_time iso>~<show id>",
+  # in UTC with a Z so that it needs no escaping in a query string.
+  return '%s~%d' % (row.start_time.astimezone(pytz.UTC).isoformat().replace('+00:00', 'Z'), row.id)
+
+def decode_cursor(cursor):
+  start_time, _, show_id = cursor.rpartition('~')
+  return dateutil.parser.isoparse(start_time), int(show_id)
+
+def cursor_filter(cursor, before=False):
+  # Shows after (or before) a cursor. The bare start_time bound repeats the
+  # row comparison in a form Postgres prunes partitions with, so a page only
+  # reads the years from the cursor on.
+  start_time, show_id = decode_cursor(cursor)
+  key = db.tuple_(Shows.start_time, Shows.id)
+  if before:
+    return db.and_(key < (start_time, show_id), Shows.start_time <= start_time)
+  return db.and_(key > (start_time, show_id), Shows.start_time >= start_time)
+
+GENRES = [g.value for g in genres_list]
+
+def selected_genres():
+  # ?genre=Jazz&genre=Blues (query string or form), in vocabulary order;
+  # ?match=any asks for any of them instead of all
+  wanted = set(request.values.getlist('genre'))
+  return [g for g in GENRES if g in wanted], request.values.get('match') == 'any'
+
+def genre_filter(model, genres, any_genre=False):
+  # @> (has all) or && (has any), both answered by the GIN index on genres.
+  # The cast keeps the operands the column's own type, which the index needs.
+  wanted = db.cast(list(genres), model.genres.type)
+  return model.genres.op('&&' if any_genre else '@>')(wanted)
+
+def genre_facets(model, genres=(), any_genre=False):
+  # How many of the listed venues/artists have each genre of the vocabulary,
+  # from one grouped query over the unnested genres. The app's facet cache
+  # maps (table, genres, any) -> (expires, facets) for GENRE_FACETS_TTL.
+  genre_facet_cache = current_app.extensions['genre_facets']
+  key = (model.__tablename__, tuple(genres), any_genre)
+  hit = genre_facet_cache.get(key)
+  if hit is not None and hit[0] > time.time():
+    return hit[1]
+  names = db.session.query(func.unnest(model.genres).label('genre'))
+  if genres:
+    names = names.filter(genre_filter(model, genres, any_genre))
+  names = names.subquery()
+  counts = dict(db.session.query(names.c.genre, func.count()).group_by(names.c.genre))
+  facets = [{"genre": g, "count": counts.get(g, 0)} for g in GENRES]
+  if len(genre_facet_cache) >= 1000:
+    genre_facet_cache.clear()
+  genre_facet_cache[key] = (time.time() + current_app.config['GENRE_FACETS_TTL'], facets)
+  return facets
+
+def facet_links(model, genres, any_genre):
+  # the facets, each with the genre selection that clicking it leads to
+  links = []
+  for facet in genre_facets(model, genres, any_genre):
+    selected = facet["genre"] in genres
+    if facet["count"] or selected:
+      toggled = [g for g in genres if g != facet["genre"]] if selected else genres + [facet["genre"]]
+      links.append(dict(facet, selected=selected, genres=[g for g in GENRES if g in toggled]))
+  return links
+
+def prefix_tsquery(term, weight=''):
+  # "musical ho" -> 'musical:* & ho:*', or None for a term without words. With
+  # weight='A' only the name part of search_vector can match.
+  words = re.findall(r'\w+', term.lower())
+  if not words:
+    return None
+  return func.to_tsquery('simple', ' & '.join(w + ':*' + weight for w in words))
+
+def search(model, term, genres=(), any_genre=False):
+  # Ranked full-text search over the indexed search_vector. Every word of the
+  # term is matched as a prefix ("music" finds "Musical"); names holding the
+  # term anywhere ("a" in "Matt Quevado") match too, ranked after them. The
+  # total is a window count so the page and its count come back in one round
+  # trip.
+  term = term.strip()
+  tsquery = prefix_tsquery(term)
+  q = db.session.query(model.id, model.name, func.count().over().label('total'))
+  if genres:
+    q = q.filter(genre_filter(model, genres, any_genre))
+  if tsquery is not None:
+    q = q.filter(db.or_(model.search_vector.op('@@')(tsquery),
+                        func.lower(model.name).contains(term.lower(), autoescape=True))) \
+      .order_by(func.ts_rank(model.search_vector, tsquery).desc(), model.name)
+  elif term:
+    q = q.filter(func.lower(model.name).contains(term.lower(), autoescape=True)).order_by(model.name)
+  else:
+    q = q.order_by(model.name)
+  rows = q.limit(current_app.config['SEARCH_RESULTS_LIMIT']).all()
+  return {
+    "count": rows[0].total if rows else 0,
+    "data": rows
+  }
+
+#----------------------------------------------------------------------------#
+# Name suggestions.
+#----------------------------------------------------------------------------#
+
+# Per-process prefix indexes behind /api/search/suggest, one per kind and app
+# (create_app() adds them to app.extensions). They are built on the first
+# request, updated by this worker's create/edit/delete routes, and rebuilt
+# from the database once older than SUGGEST_MAX_AGE seconds.
+SUGGESTED = {"artists": Artist, "venues": Venue}
+
+def name_index(kind):
+  return current_app.extensions['suggestions'][kind]
+
+def rebuild_suggestions(force=False):
+  for kind, model in SUGGESTED.items():
+    index = name_index(kind)
+    if force or index.stale(current_app.config['SUGGEST_MAX_AGE']):
+      index.rebuild(db.session.query(model.id, model.name).yield_per(1000),
+                    current_app.config['SUGGEST_MAX_ENTRIES'])
+
+def suggest_name(index, entity_id, name):
+  index.add(entity_id, name, current_app.config['SUGGEST_MAX_ENTRIES'])
+
+main.before_app_first_request(rebuild_suggestions)
+
+#----------------------------------------------------------------------------#
+# Matchmaking.
+#----------------------------------------------------------------------------#
+
+# Per-process feature matrices of all artists and venues behind the
+# suggested-artists/-venues endpoints (matchmaking.py), per app like the name
+# suggestions. They are built on first use, updated by this worker's writes
+# and rebuilt once older than MATCH_MAX_AGE seconds, by one request while the
+# others keep using the old matrices.
+MATCHED = {
+  "artists": (Artist, Artist.seeking_venue, Shows.artist_id),
+  "venues": (Venue, Venue.seeking_talent, Shows.venue_id)
+}
+
+def match_index(kind):
+  return current_app.extensions['matches'][kind]
+
+def rebuild_matches(force=False):
+  # shows since MATCH_RECENT_DAYS ago, upcoming ones included, count as recent
+  since = datetime.now(pytz.UTC) - timedelta(days=current_app.config['MATCH_RECENT_DAYS'])
+  for kind, (model, seeking, entity_fk) in MATCHED.items():
+    index = match_index(kind)
+    if force or index.stale(current_app.config['MATCH_MAX_AGE']):
+      recent = db.session.query(entity_fk.label('id'), func.count().label('shows')) \
+        .filter(Shows.start_time > since).group_by(entity_fk).subquery()
+      index.rebuild(db.session.query(model.id, model.genres, model.city, model.state, seeking,
+                                     func.coalesce(recent.c.shows, 0))
+                    .outerjoin(recent, recent.c.id == model.id).yield_per(5000))
+
+def suggested_matches(own, entity_id, other, other_model):
+  # the best `other` candidates for one venue/artist of `own`; ?seeking=0
+  # also ranks those not looking for a venue/talent
+  rebuild_matches()
+  profile = own.profile(entity_id)
+  if profile is None:
+    abort(404)
+  limit = max(1, min(request.args.get('limit', 10, type=int), 100))
+  ranked = other.score(*profile, limit=limit, seeking_only=request.args.get('seeking') != '0')
+  names = dict(db.session.query(other_model.id, other_model.name)
+               .filter(other_model.id.in_([r["id"] for r in ranked]))) if ranked else {}
+  for r in ranked:
+    r["name"] = names.get(r["id"])
+  return jsonify({"data": ranked})
+
+#----------------------------------------------------------------------------#
+# Page cache invalidation.
+#----------------------------------------------------------------------------#
+
+# Cached pages are tagged 'venues', 'artists', 'shows' (the listings and the
+# feed), 'venue:<id>' and 'artist:<id>'. A venue or artist change reaches the
+# listings, the feed, its own page and the pages of everyone it has shows with.
+
+def venue_pages(venue_id):
+  artist_ids = db.session.query(Shows.artist_id).filter_by(venue_id=venue_id).distinct()
+  return ['venues', 'shows', 'venue:%d' % venue_id] + ['artist:%d' % a for a, in artist_ids]
+
+def artist_pages(artist_id):
+  venue_ids = db.session.query(Shows.venue_id).filter_by(artist_id=artist_id).distinct()
+  return ['artists', 'shows', 'artist:%d' % artist_id] + ['venue:%d' % v for v, in venue_ids]
+
+def show_pages(artist_id, venue_id):
+  return ['venues', 'shows', 'venue:%d' % venue_id, 'artist:%d' % artist_id]
+
+# The validators of the feed and the detail pages read these versions instead
+# of the shows. Show writes move them in the count triggers; an edit of a
+# venue or artist moves them here, before its own row is written, so that it
+# locks the clock first like the triggers do.
+TOUCH_SHOWS = text('UPDATE show_clock SET shows_changed_at = clock_timestamp() WHERE id = 1')
+
+def touch_show_pages(model, entity_id):
+  if model is Venue:
+    other, entity_fk, other_fk = Artist, Shows.venue_id, Shows.artist_id
+  else:
+    other, entity_fk, other_fk = Venue, Shows.artist_id, Shows.venue_id
+  db.session.execute(TOUCH_SHOWS)
+  db.session.query(other).filter(other.id.in_(db.session.query(other_fk).filter(entity_fk == entity_id))) \
+    .update({other.shows_changed_at: func.clock_timestamp()}, synchronize_session=False)
+
+#----------------------------------------------------------------------------#
+# Show counters.
+#----------------------------------------------------------------------------#
+
+# The triggers keep the counters right as shows are written; rolling keeps
+# them right as time passes. One statement moves every show that started since
+# the last roll from upcoming to past and advances the clock.
+
+ROLL_SHOW_COUNTS = text('''
+  WITH moved AS (
+    SELECT s.venue_id, s.artist_id FROM "Shows" s, show_clock c
+    WHERE c.id = 1 AND s.start_time > c.rolled_at AND s.start_time <= now()
+  ), venues AS (
+    UPDATE "Venue" t SET upcoming_shows_count = upcoming_shows_count - d.n, past_shows_count = past_shows_count + d.n
+    FROM (SELECT venue_id AS id, count(*) AS n FROM moved GROUP BY venue_id) d WHERE t.id = d.id
+  ), artists AS (
+    UPDATE "Artist" t SET upcoming_shows_count = upcoming_shows_count - d.n, past_shows_count = past_shows_count + d.n
+    FROM (SELECT artist_id AS id, count(*) AS n FROM moved GROUP BY artist_id) d WHERE t.id = d.id
+  ), clock AS (
+    UPDATE show_clock SET rolled_at = now() WHERE id = 1
+  )
+  SELECT (SELECT count(*) FROM moved),
+         ARRAY(SELECT DISTINCT venue_id FROM moved),
+         ARRAY(SELECT DISTINCT artist_id FROM moved)''')
+
+REBUILD_SHOW_COUNTS = [text('UPDATE show_clock SET rolled_at = now() WHERE id = 1')] + [text('''
+  UPDATE "{table}" t SET
+    upcoming_shows_count = (SELECT count(*) FROM "Shows" s WHERE s.{fk} = t.id AND s.start_time > now()),
+    past_shows_count = (SELECT count(*) FROM "Shows" s WHERE s.{fk} = t.id AND s.start_time <= now())'''
+  .format(table=table, fk=fk)) for table, fk in (('Venue', 'venue_id'), ('Artist', 'artist_id'))]
+
+def roll_show_counts():
+  # SKIP LOCKED gives up at once while another roll runs, or while show
+  # writes in flight hold the clock row (their count triggers update it).
+  # Nothing is lost: the next roll moves every show since rolled_at. Returns
+  # the number of shows moved.
+  current_app.extensions['show_counts_rolled'] = time.time()
+  with db.engine.begin() as conn:
+    if conn.execute(text('SELECT 1 FROM show_clock WHERE id = 1 FOR UPDATE SKIP LOCKED')).first() is None:
+      return 0
+    moved, venue_ids, artist_ids = conn.execute(ROLL_SHOW_COUNTS).first()
+  if moved:
+    page_cache.invalidate('venues', 'shows', *['venue:%d' % v for v in venue_ids] + ['artist:%d' % a for a in artist_ids])
+  return moved
+
+def rebuild_show_counts():
+  # Recount everything from Shows, e.g. after editing shows with the triggers
+  # disabled. Cached detail pages catch up within CACHE_TTL.
+  with db.engine.begin() as conn:
+    conn.execute(text('SELECT 1 FROM show_clock WHERE id = 1 FOR UPDATE'))
+    for statement in REBUILD_SHOW_COUNTS:
+      conn.execute(statement)
+  page_cache.invalidate('venues', 'artists', 'shows')
+
+@main.before_app_request
+def roll_show_counts_due():
+  # Without a scheduled `flask roll-show-counts`, each worker rolls at most
+  # once per SHOW_COUNTS_ROLL_INTERVAL seconds, ahead of a request. A failed
+  # roll is logged and left to the next one; the request goes on.
+  interval = current_app.config['SHOW_COUNTS_ROLL_INTERVAL']
+  if interval and time.time() - current_app.extensions['show_counts_rolled'] >= interval:
+    try:
+      roll_show_counts()
+    except Exception:
+      current_app.logger.exception('rolling the show counts failed')
+
+#----------------------------------------------------------------------------#
+# Show partitions.
+#----------------------------------------------------------------------------#
+
+# Shows has one partition per UTC year, "Shows_<year>". A query that bounds
+# start_time (the upcoming lists, feed pages, the roll, bookings and
+# availability) only reads the years in range. Shows of a year without a
+# partition land in "Shows_default" until the year gets one. Archived years
+# are detached into the "archive" schema: they leave every page and the past
+# counters, but stay in the database.
+
+SHOW_PARTITIONS = text('''
+  SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+  WHERE i.inhparent = '"Shows"'::regclass''')
+
+SHOW_ARCHIVE_SCHEMA = 'archive'
+
+def show_partition_years(conn):
+  return sorted(int(name[6:]) for name, in conn.execute(SHOW_PARTITIONS) if name[6:].isdigit())
+
+def create_show_partitions(ahead):
+  # The missing partitions of this year and the `ahead` years after it, one
+  # transaction each: the year's shows are moved out of the default partition
+  # (partition to partition, so the count triggers stay out of it) and the new
+  # table is attached. Returns the years created.
+  this = datetime.now(pytz.UTC).year
+  created = []
+  for year in range(this, this + ahead + 1):
+    with db.engine.begin() as conn:
+      if year in show_partition_years(conn):
+        continue
+      start, end = '%d-01-01 00:00+00' % year, '%d-01-01 00:00+00' % (year + 1)
+      conn.execute(text('CREATE TABLE "Shows_%d" (LIKE "Shows" INCLUDING DEFAULTS)' % year))
+      conn.execute(text('WITH moved AS (DELETE FROM "Shows_default" WHERE start_time >= :start AND start_time < :end '
+                        'RETURNING *) INSERT INTO "Shows_%d" SELECT * FROM moved' % year), start=start, end=end)
+      conn.execute(text('ALTER TABLE "Shows" ATTACH PARTITION "Shows_%d" FOR VALUES FROM (\'%s\') TO (\'%s\')'
+                        % (year, start, end)))
+    created.append(year)
+  return created
+
+def archive_show_partitions(before):
+  # Detaches the partitions of the years before `before` into the archive
+  # schema and takes their shows off the past counters, in one transaction.
+  # Only years that ended before the show clock can go. Returns the years.
+  with db.engine.begin() as conn:
+    rolled_at = conn.execute(text('UPDATE show_clock SET shows_changed_at = clock_timestamp() WHERE id = 1 '
+                                  'RETURNING rolled_at')).scalar()
+    years = [y for y in show_partition_years(conn) if y < min(before, rolled_at.astimezone(pytz.UTC).year)]
+    if years:
+      conn.execute(text('CREATE SCHEMA IF NOT EXISTS %s' % SHOW_ARCHIVE_SCHEMA))
+    for year in years:
+      conn.execute(text('ALTER TABLE "Shows" DETACH PARTITION "Shows_%d"' % year))
+      conn.execute(text('ALTER TABLE "Shows_%d" SET SCHEMA %s' % (year, SHOW_ARCHIVE_SCHEMA)))
+      for table, fk in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        conn.execute(text('UPDATE "{table}" t SET past_shows_count = past_shows_count - d.n '
+                          'FROM (SELECT {fk} AS id, count(*) AS n FROM {schema}."Shows_{year}" GROUP BY {fk}) d '
+                          'WHERE t.id = d.id'.format(table=table, fk=fk, schema=SHOW_ARCHIVE_SCHEMA, year=year)))
+  if years:
+    page_cache.invalidate('venues', 'artists', 'shows')
+  return years
+
+#----------------------------------------------------------------------------#
+# Deletes.
+#----------------------------------------------------------------------------#
+
+def delete_entities(model, ids=(), external_ids=()):
+  # Deletes any number of venues or artists, by id and/or external id, in one
+  # statement: ON DELETE CASCADE takes their shows along and the count
+  # triggers update the other side. Returns the deleted (id, name) rows.
+  if model is Venue:
+    kind, other_kind, entity_fk, other_fk = 'venue', 'artist', Shows.venue_id, Shows.artist_id
+  else:
+    kind, other_kind, entity_fk, other_fk = 'artist', 'venue', Shows.artist_id, Shows.venue_id
+  conditions = []
+  if ids:
+    conditions.append(model.id.in_(ids))
+  if external_ids:
+    conditions.append(model.external_id.in_(external_ids))
+  if not conditions:
+    return []
+  match = db.or_(*conditions)
+  # the pages of everyone they have shows with, read before the shows go
+  others = db.session.query(other_fk).join(model, model.id == entity_fk).filter(match).distinct()
+  pages = ['%s:%d' % (other_kind, o) for o, in others]
+  deleted = db.session.execute(model.__table__.delete().where(match)
+                               .returning(model.id, model.name)).fetchall()
+  db.session.commit()
+  for entity_id, name in deleted:
+    name_index(kind + 's').remove(entity_id)
+    match_index(kind + 's').remove(entity_id)
+  if deleted:
+    page_cache.invalidate(kind + 's', 'shows', *['%s:%d' % (kind, e) for e, _ in deleted] + pages)
+  return deleted
+
+#----------------------------------------------------------------------------#
+# Bookings.
+#----------------------------------------------------------------------------#
+
+# A show occupies its venue and artist for SHOW_SLOT_MINUTES from its start,
+# so two shows of the same venue or artist clash when they start less than a
+# slot apart. Both lookups are range scans of the (venue_id, start_time) and
+# (artist_id, start_time) indexes.
+
+class BookingConflict(Exception):
+  pass
+
+# Taken by every transaction that books shows, until it ends, so that two of
+# them cannot both find the same slot free. Bookings are rare next to reads;
+# one lock keeps big import batches clear of the lock table limits.
+LOCK_BOOKINGS = text("SELECT pg_advisory_xact_lock(hashtext('fyyur-bookings'))")
+
+BOOKING_CONFLICTS = text('''
+  WITH new AS (
+    SELECT * FROM unnest(CAST(:i AS int[]), CAST(:artist_ids AS int[]), CAST(:venue_ids AS int[]),
+                         CAST(:start_times AS timestamptz[]), CAST(:external_ids AS text[]))
+      AS n(i, artist_id, venue_id, start_time, external_id)
+  )
+  SELECT n.i FROM new n JOIN "Shows" s ON s.venue_id = n.venue_id
+    AND s.start_time > n.start_time - make_interval(mins => :slot)
+    AND s.start_time < n.start_time + make_interval(mins => :slot)
+    AND (s.external_id = n.external_id) IS NOT TRUE
+  UNION
+  SELECT n.i FROM new n JOIN "Shows" s ON s.artist_id = n.artist_id
+    AND s.start_time > n.start_time - make_interval(mins => :slot)
+    AND s.start_time < n.start_time + make_interval(mins => :slot)
+    AND (s.external_id = n.external_id) IS NOT TRUE
+  UNION
+  SELECT n.i FROM new n JOIN new m ON m.i < n.i
+    AND (m.venue_id = n.venue_id OR m.artist_id = n.artist_id)
+    AND m.start_time > n.start_time - make_interval(mins => :slot)
+    AND m.start_time < n.start_time + make_interval(mins => :slot)''')
+
+def booking_conflicts(conn, rows):
+  # Positions of the rows (dicts with artist_id, venue_id, start_time and
+  # optionally external_id) that clash with an existing show or an earlier
+  # row. A row whose external_id exists already does not clash with itself.
+  slot = current_app.config['SHOW_SLOT_MINUTES']
+  if not slot or not rows:
+    return set()
+  params = {
+    "i": list(range(len(rows))),
+    "artist_ids": [r["artist_id"] for r in rows],
+    "venue_ids": [r["venue_id"] for r in rows],
+    "start_times": [r["start_time"] for r in rows],
+    "external_ids": [r.get("external_id") for r in rows],
+    "slot": slot
+  }
+  conn.execute(LOCK_BOOKINGS)
+  return {i for i, in conn.execute(BOOKING_CONFLICTS, params)}
+
+VENUE_AVAILABILITY = text('''
+  WITH busy AS (
+    SELECT start_time AS starts, start_time + make_interval(mins => :slot) AS ends FROM "Shows"
+    WHERE venue_id = :venue_id AND start_time > CAST(:start AS timestamptz) - make_interval(mins => :slot)
+      AND start_time < :end
+  ), gaps AS (
+    SELECT greatest(max(ends) OVER (ORDER BY starts ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING), :start) AS free_from,
+           starts AS free_to
+    FROM busy
+    UNION ALL
+    SELECT greatest(max(ends), :start), :end FROM busy
+  )
+  SELECT free_from, free_to FROM gaps
+  WHERE free_to - free_from >= make_interval(mins => :slot)
+  ORDER BY free_from''')
 
-app.jinja_env.filters['datetime'] = format_datetime
+def venue_availability(venue_id, start, end):
+  # The free stretches of at least one slot between start and end: the gaps
+  # between the venue's booked slots, found by one window query.
+  slot = current_app.config['SHOW_SLOT_MINUTES'] or 0
+  rows = db.session.execute(VENUE_AVAILABILITY, {"venue_id": venue_id, "start": start, "end": end, "slot": slot})
+  return [{"from": r.free_from, "to": r.free_to} for r in rows]
+
+#----------------------------------------------------------------------------#
+# Show series.
+#----------------------------------------------------------------------------#
+
+class SeriesTooLong(ValueError):
+  pass
+
+def expand_series(rule, start_time, limit):
+  # The start times of a series. A rule with more than `limit` of them, or
+  # with no end at all, is a ValueError like a malformed one.
+  times = list(islice(dateutil.rrule.rrulestr(rule, dtstart=start_time), limit + 1))
+  if len(times) > limit:
+    raise SeriesTooLong('a series may have at most %d shows' % limit)
+  return times
+
+def create_series(artist_id, venue_id, start_time, rule):
+  # Adds the series and all of its shows to the session's transaction: one
+  # INSERT for the series, one multi-row INSERT for the shows. Returns the
+  # number of shows.
+  times = expand_series(rule, start_time, current_app.config['SERIES_MAX_SHOWS'])
+  rows = [{
+    "artist_id": artist_id,
+    "venue_id": venue_id,
+    "start_time": t
+  } for t in times]
+  clashes = booking_conflicts(db.session, rows)
+  if clashes:
+    raise BookingConflict('%d of the %d shows clash with other bookings of the venue or artist'
+                          % (len(clashes), len(rows)))
+  series = ShowSeries(artist_id=artist_id, venue_id=venue_id, start_time=start_time, rule=rule)
+  db.session.add(series)
+  db.session.flush()
+  for row in rows:
+    row["series_id"] = series.id
+  db.session.execute(Shows.__table__.insert().values(rows))
+  return len(rows)
+
+#----------------------------------------------------------------------------#
+# Conditional GETs.
+#----------------------------------------------------------------------------#
+
+# Validators are a primary key lookup of versions the writes keep: the
+# updated_at and show counters of a venue or artist, and the shows_changed_at
+# of its row and of the show clock (see touch_show_pages). The counts are part
+# of them because roll_show_counts() moves shows from upcoming to past.
+# Pages carry only an ETag: a delete or a roll changes the page without moving
+# any timestamp forward, so a Last-Modified could answer 304 to a stale copy.
+
+def conditional(validator):
+  # Answer If-None-Match with a 304 before the view runs. validator(**view_args)
+  # returns the row of values the page depends on, or None to let the view
+  # decide (404).
+  def decorator(view):
+    @wraps(view)
+    def wrapper(**kwargs):
+      if '_flashes' in session:
+        return view(**kwargs)
+      values = validator(**kwargs)
+      if values is None:
+        return view(**kwargs)
+      etag = hashlib.md5(repr(tuple(values)).encode()).hexdigest()
+      if request.if_none_match.contains(etag):
+        response = Response(status=304)
+      else:
+        response = make_response(view(**kwargs))
+      response.set_etag(etag)
+      response.cache_control.no_cache = True
+      return response
+    return wrapper
+  return decorator
+
+def newest(*columns):
+  return func.greatest(*[func.max(c) for c in columns])
+
+def venues_validator():
+  return db.session.query(
+    db.session.query(newest(Venue.updated_at)).label('venues_at'),
+    db.session.query(func.count(Venue.id)).label('venues'),
+    db.session.query(func.sum(Venue.upcoming_shows_count)).label('upcoming')).one()
+
+def artists_validator():
+  return db.session.query(newest(Artist.updated_at), func.count(Artist.id)).one()
+
+def shows_validator():
+  q = db.session.query(ShowClock.shows_changed_at).filter_by(id=1)
+  if request.args.get('upcoming') == '1':
+    # a roll takes shows off the upcoming feed
+    q = q.add_columns(ShowClock.rolled_at)
+  return q.one()
+
+def detail_validator(model, entity_id):
+  return db.session.query(model.updated_at, model.shows_changed_at, model.upcoming_shows_count,
+                          model.past_shows_count).filter(model.id == entity_id).first()
+
+def venue_validator(venue_id):
+  return detail_validator(Venue, venue_id)
+
+def artist_validator(artist_id):
+  return detail_validator(Artist, artist_id)
+
+#----------------------------------------------------------------------------#
+# Read replica.
+#----------------------------------------------------------------------------#
+
+# Views marked read_only query the replica bind, if configured. A client that
+# wrote something reads from the primary for the next REPLICA_GRACE seconds,
+# so it sees its own change despite replication lag. It skips the page cache
+# meanwhile: another visitor may have refilled it from the lagging replica.
+
+@main.before_app_request
+def use_primary():
+  g.read_only = False
+
+def read_only(view):
+  @wraps(view)
+  def wrapper(**kwargs):
+    g.read_only = session.get('wrote_at', 0) + current_app.config['REPLICA_GRACE'] < time.time()
+    g.skip_page_cache = not g.read_only
+    return view(**kwargs)
+  return wrapper
+
+@main.after_app_request
+def remember_write(response):
+  if request.method not in ('GET', 'HEAD', 'OPTIONS') and not g.get('read_only') \
+     and 'replica' in (current_app.config['SQLALCHEMY_BINDS'] or ()):
+    session['wrote_at'] = time.time()
+  return response
+
+def pool_stats(engine):
+  pool = engine.pool
+  if not hasattr(pool, 'checkedout'):
+    return {"pool": type(pool).__name__}
+  return {
+    "pool": type(pool).__name__,
+    "size": pool.size(),
+    "checked_in": pool.checkedin(),
+    "checked_out": pool.checkedout(),
+    "overflow": pool.overflow()
+  }
+
+#----------------------------------------------------------------------------#
+# Streamed listings.
+#----------------------------------------------------------------------------#
+
+def batched(query):
+  # rows from a server-side cursor, STREAM_BATCH at a time
+  return query.execution_options(stream_results=True).yield_per(current_app.config['STREAM_BATCH'])
+
+def render_listing(template_name, **context):
+  # With STREAM_LISTINGS the page is sent in chunks while the template walks
+  # the (lazy) rows, so the first byte leaves before the last row is read.
+  # A pending flash is rendered in full: it is popped from the session during
+  # rendering, and a streamed page has already sent its cookie by then.
+  if not current_app.config['STREAM_LISTINGS'] or '_flashes' in session:
+    return render_template(template_name, **context)
+  current_app.update_template_context(context)
+  stream = current_app.jinja_env.get_template(template_name).stream(context)
+  stream.enable_buffering(current_app.config['STREAM_BUFFER'])
+  return Response(stream_with_context(timed_render(stream)), mimetype='text/html')
+
+def timed_render(stream):
+  # Template.stream() sends no render signals: the time spent producing each
+  # chunk counts as rendering, lazy queries included as with render_template.
+  chunks = iter(stream)
+  while True:
+    started = time.perf_counter()
+    chunk = next(chunks, None)
+    g.render_time = g.get('render_time', 0.0) + time.perf_counter() - started
+    if chunk is None:
+      return
+    yield chunk
 
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
 
-@app.route('/')
+@main.route('/')
 def index():
   return render_template('pages/home.html')
 
@@ -110,86 +1057,88 @@ def index():
 #  Venues
 #  ----------------------------------------------------------------
 
-@app.route('/venues')
+@main.route('/venues')
+@read_only
+@conditional(venues_validator)
+@page_cache.cached('venues')
 def venues():
-  # TODO: replace with real venues data.
-  #       num_shows should be aggregated based on number of upcoming shows per venue.
-  data1 = db.session.query(Venue.city,Venue.state).distinct()
-  data=[]
-  for d in data1:
-    venues = Venue.query.filter_by(city=d.city,state=d.state).order_by('id').all()
-    datax={
-      "city": d.city,
-      "state": d.state,
-      "venues": []
-    }
-    for v in venues:
-      datax["venues"].append(v)
-    data.append(datax)
-  return render_template('pages/venues.html', areas=data)
-
-@app.route('/venues/search', methods=['POST'])
+  # Every venue with its stored upcoming show count, ordered so the areas can
+  # be assembled with a single pass over the rows.
+  genres, any_genre = selected_genres()
+  rows = db.session.query(Venue.id, Venue.name, Venue.city, Venue.state,
+                          Venue.upcoming_shows_count.label('num_shows')) \
+    .order_by(Venue.state, Venue.city, Venue.id)
+  if genres:
+    rows = rows.filter(genre_filter(Venue, genres, any_genre))
+  # the areas are generated as the template asks for them, so with
+  # STREAM_LISTINGS no more than one batch of rows is ever in memory
+  data = ({
+    "city": city,
+    "state": state,
+    "venues": venues
+  } for (city, state), venues in groupby(batched(rows), key=lambda r: (r.city, r.state)))
+  return render_listing('pages/venues.html', areas=data, selected_genres=genres, match_any=any_genre,
+                        facets=facet_links(Venue, genres, any_genre))
+
+@main.route('/venues/search', methods=['POST'])
+@read_only
 def search_venues():
   # TODO: implement search on venues with partial string search. Ensure it is case-insensitive.
   # seach for Hop should return "The Musical Hop".
   # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
-  data = request.form.get('search_term', '')
-  ven_search = Venue.query.filter(func.lower(Venue.name).contains(func.lower(data)))
-  response={
-    "count": ven_search.count(),
-    "data": ven_search
-  }
-  return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
+  genres, any_genre = selected_genres()
+  response = search(Venue, request.form.get('search_term', ''), genres, any_genre)
+  return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''),
+                         selected_genres=genres, match_any=any_genre)
 
-@app.route('/venues/<int:venue_id>')
+@main.route('/venues/<int:venue_id>')
+@read_only
+@conditional(venue_validator)
+@page_cache.cached('venue:{venue_id}')
 def show_venue(venue_id):
   # shows the venue page with the given venue_id
   # TODO: replace with real venue data from the venues table, using venue_id
-  data1 = Venue.query.filter_by(id=venue_id).first()
-  data={
-    "id": data1.id,
-    "name": data1.name,
-    "genres": data1.genres,
-    "address": data1.address,
-    "city": data1.city,
-    "state": data1.state,
-    "phone": data1.phone,
-    "website": data1.website,
-    "facebook_link": data1.facebook_link,
-    "seeking_talent": data1.seeking_talent,
-    "seeking_description": data1.seeking_description,
-    "image_link": data1.image_link,
-    "past_shows": [],
-    "upcoming_shows": [],
-    "past_shows_count": 0,
-    "upcoming_shows_count": 0
-  }
-  x=Shows.query.join(Venue.shows).filter(Venue.id==venue_id)
-  if x.first() != None:
-    for a in x:
-      datax={
-        "artist_id": a.artists[0].id,
-        "artist_name": a.artists[0].name,
-        "artist_image_link": a.artists[0].image_link,
-        "start_time": str(a.start_time)
-      }
-      if pytz.UTC.localize(datetime.now()) < a.start_time.replace(tzinfo=pytz.UTC) :
-        data["upcoming_shows"].append(datax)
-      else:
-        data["past_shows"].append(datax)
-    data["past_shows_count"] = len(data["past_shows"])
-    data["upcoming_shows_count"] = len(data["upcoming_shows"])
-  return render_template('pages/show_venue.html', venue=data)
+  return render_template('pages/show_venue.html', venue=venue_detail(venue_id))
+
+@main.route('/venues/<int:venue_id>/availability')
+@read_only
+def venue_availability_view(venue_id):
+  # ?from= and ?to= are ISO 8601 (UTC unless they carry an offset); by
+  # default the next AVAILABILITY_DAYS days
+  try:
+    start = dateutil.parser.isoparse(request.args['from']) if 'from' in request.args else datetime.now(pytz.UTC)
+    start = start if start.tzinfo else start.replace(tzinfo=pytz.UTC)
+    end = dateutil.parser.isoparse(request.args['to']) if 'to' in request.args \
+      else start + timedelta(days=current_app.config['AVAILABILITY_DAYS'])
+    end = end if end.tzinfo else end.replace(tzinfo=pytz.UTC)
+  except ValueError:
+    api_error(400, 'from and to must be ISO 8601 times')
+  if not start < end <= start + timedelta(days=current_app.config['AVAILABILITY_MAX_DAYS']):
+    api_error(400, 'to must be after from, by at most %d days' % current_app.config['AVAILABILITY_MAX_DAYS'])
+  if db.session.query(Venue.id).filter_by(id=venue_id).first() is None:
+    abort(404)
+  return Response(dumps({
+    "venue_id": venue_id,
+    "from": start,
+    "to": end,
+    "slot_minutes": current_app.config['SHOW_SLOT_MINUTES'],
+    "free": venue_availability(venue_id, start, end)
+  }), mimetype='application/json')
+
+@main.route('/venues/<int:venue_id>/suggested-artists')
+@read_only
+def suggested_artists(venue_id):
+  return suggested_matches(match_index('venues'), venue_id, match_index('artists'), Artist)
 
 #  Create Venue
 #  ----------------------------------------------------------------
 
-@app.route('/venues/create', methods=['GET'])
+@main.route('/venues/create', methods=['GET'])
 def create_venue_form():
   form = VenueForm()
   return render_template('forms/new_venue.html', form=form)
 
-@app.route('/venues/create', methods=['POST'])
+@main.route('/venues/create', methods=['POST'])
 def create_venue_submission():
   # TODO: insert form data as a new Venue record in the db, instead
   # TODO: modify data to be the data object returned from db insertion
@@ -212,6 +1161,9 @@ def create_venue_submission():
 
     db.session.add(venue)
     db.session.commit()
+    suggest_name(name_index('venues'), venue.id, venue.name)
+    match_index('venues').upsert(venue.id, venue.genres, venue.city, venue.state, venue.seeking_talent)
+    page_cache.invalidate('venues')
     flash('Venue ' + request.form['name'] + ' was successfully listed!')
   except:
     db.session.rollback()
@@ -224,104 +1176,98 @@ def create_venue_submission():
   return render_template('pages/home.html')
 
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
+@main.route('/venues/<int:venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
   # TODO: Complete this endpoint for taking a venue_id, and using
   # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
-  vname = Venue.query.filter_by(id=venue_id).first().name
   try:
-    shws = Shows.query.join(Venue.shows).filter(Venue.id==venue_id).all()
-    if len(shws)>0:
-      for x in shws:
-        db.session.delete(x)
-    ven = Venue.query.get(venue_id)
-    db.session.delete(ven)
-    db.session.commit()
-    flash('Venue ' + vname + ' was successfully deleted!')
+    deleted = delete_entities(Venue, ids=[venue_id])
   except:
     db.session.rollback()
-    flash('An error occurred. Venue ' + vname + ' could not be deleted.')
+    deleted = None
+    flash('An error occurred. Venue %d could not be deleted.' % venue_id)
   finally:
     db.session.close()
+  if deleted == []:
+    abort(404)
+  if deleted:
+    flash('Venue ' + deleted[0].name + ' was successfully deleted!')
   # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
   # clicking that button delete it from the db then redirect the user to the homepage
   return render_template('pages/home.html')
 
 #  Artists
 #  ----------------------------------------------------------------
-@app.route('/artists')
+@main.route('/artists')
+@read_only
+@conditional(artists_validator)
+@page_cache.cached('artists')
 def artists():
   # TODO: replace with real data returned from querying the database
-  data = Artist.query.order_by('name').all()
-  return render_template('pages/artists.html', artists=data)
+  genres, any_genre = selected_genres()
+  data = db.session.query(Artist.id, Artist.name).order_by(Artist.name)
+  if genres:
+    data = data.filter(genre_filter(Artist, genres, any_genre))
+  return render_listing('pages/artists.html', artists=batched(data), selected_genres=genres,
+                        match_any=any_genre, facets=facet_links(Artist, genres, any_genre))
 
-@app.route('/artists/search', methods=['POST'])
+@main.route('/artists/search', methods=['POST'])
+@read_only
 def search_artists():
   # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
   # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
   # search for "band" should return "The Wild Sax Band".
-  data = request.form.get('search_term', '')
-  art_search = Artist.query.filter(func.lower(Artist.name).contains(func.lower(data)))
-  response={
-    "count": art_search.count(),
-    "data": art_search
-  }
-  return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
+  genres, any_genre = selected_genres()
+  response = search(Artist, request.form.get('search_term', ''), genres, any_genre)
+  return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''),
+                         selected_genres=genres, match_any=any_genre)
 
-@app.route('/artists/<int:artist_id>')
+@main.route('/artists/<int:artist_id>')
+@read_only
+@conditional(artist_validator)
+@page_cache.cached('artist:{artist_id}')
 def show_artist(artist_id):
   # shows the venue page with the given venue_id
   # TODO: replace with real venue data from the venues table, using venue_id
-  data1 = Artist.query.filter_by(id=artist_id).first()
-  data={
-    "id": data1.id,
-    "name": data1.name,
-    "genres": data1.genres,
-    "city": data1.city,
-    "state": data1.state,
-    "phone": data1.phone,
-    "website": data1.website,
-    "facebook_link": data1.facebook_link,
-    "seeking_venue": data1.seeking_venue,
-    "seeking_description": data1.seeking_description,
-    "image_link": data1.image_link,
-    "past_shows": [],
-    "upcoming_shows": [],
-    "past_shows_count": 0,
-    "upcoming_shows_count": 0
-  }
-  x=Shows.query.join(Artist.shows).filter(Artist.id==artist_id)
-  if x.first() != None:
-    for a in x:
-      datax={
-        "venue_id": a.venues[0].id,
-        "venue_name": a.venues[0].name,
-        "venue_image_link": a.venues[0].image_link,
-        "start_time": str(a.start_time)
-      }
-      if pytz.UTC.localize(datetime.now()) < a.start_time.replace(tzinfo=pytz.UTC) :
-        data["upcoming_shows"].append(datax)
-      else:
-        data["past_shows"].append(datax)
-    data["past_shows_count"] = len(data["past_shows"])
-    data["upcoming_shows_count"] = len(data["upcoming_shows"])
-  return render_template('pages/show_artist.html', artist=data)
+  return render_template('pages/show_artist.html', artist=artist_detail(artist_id))
+
+@main.route('/artists/<int:artist_id>/suggested-venues')
+@read_only
+def suggested_venues(artist_id):
+  return suggested_matches(match_index('artists'), artist_id, match_index('venues'), Venue)
+
+@main.route('/artists/<int:artist_id>', methods=['DELETE'])
+def delete_artist(artist_id):
+  try:
+    deleted = delete_entities(Artist, ids=[artist_id])
+  except:
+    db.session.rollback()
+    deleted = None
+    flash('An error occurred. Artist %d could not be deleted.' % artist_id)
+  finally:
+    db.session.close()
+  if deleted == []:
+    abort(404)
+  if deleted:
+    flash('Artist ' + deleted[0].name + ' was successfully deleted!')
+  return render_template('pages/home.html')
 
 #  Update
 #  ----------------------------------------------------------------
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@main.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
   form = ArtistForm()
   artist = Artist.query.filter_by(id=artist_id).first()
   # TODO: populate form with fields from artist with ID <artist_id>
   return render_template('forms/edit_artist.html', form=form, artist=artist)
 
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@main.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
   # TODO: take values from the form submitted, and update existing
   # artist record with ID <artist_id> using the new attributes
   try:
     artist = Artist.query.filter_by(id=artist_id).first()
+    touch_show_pages(Artist, artist.id)
     artist.name = request.form['name']
     artist.city = request.form['city']
     artist.state = request.form['state']
@@ -337,6 +1283,9 @@ def edit_artist_submission(artist_id):
       artist.seeking_venue = False
 
     db.session.commit()
+    suggest_name(name_index('artists'), artist.id, artist.name)
+    match_index('artists').upsert(artist.id, artist.genres, artist.city, artist.state, artist.seeking_venue)
+    page_cache.invalidate(*artist_pages(artist_id))
     flash('Artist ' + request.form['name'] + ' was successfully updated!')
   except:
     db.session.rollback()
@@ -344,21 +1293,22 @@ def edit_artist_submission(artist_id):
   finally:
     db.session.close()
 
-  return redirect(url_for('show_artist', artist_id=artist_id))
+  return redirect(url_for('main.show_artist', artist_id=artist_id))
 
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@main.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
   form = VenueForm()
   venue = Venue.query.filter_by(id=venue_id).first()
   # TODO: populate form with values from venue with ID <venue_id>
   return render_template('forms/edit_venue.html', form=form, venue=venue)
 
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@main.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
   # TODO: take values from the form submitted, and update existing
   # venue record with ID <venue_id> using the new attributes
   try:
     venue = Venue.query.filter_by(id=venue_id).first()
+    touch_show_pages(Venue, venue.id)
     venue.name = request.form['name']
     venue.city = request.form['city']
     venue.state = request.form['state']
@@ -375,6 +1325,9 @@ def edit_venue_submission(venue_id):
       venue.seeking_talent = False
 
     db.session.commit()
+    suggest_name(name_index('venues'), venue.id, venue.name)
+    match_index('venues').upsert(venue.id, venue.genres, venue.city, venue.state, venue.seeking_talent)
+    page_cache.invalidate(*venue_pages(venue_id))
     flash('Venue ' + request.form['name'] + ' was successfully updated!')
   except:
     db.session.rollback()
@@ -382,17 +1335,17 @@ def edit_venue_submission(venue_id):
   finally:
     db.session.close()
 
-  return redirect(url_for('show_venue', venue_id=venue_id))
+  return redirect(url_for('main.show_venue', venue_id=venue_id))
 
 #  Create Artist
 #  ----------------------------------------------------------------
 
-@app.route('/artists/create', methods=['GET'])
+@main.route('/artists/create', methods=['GET'])
 def create_artist_form():
   form = ArtistForm()
   return render_template('forms/new_artist.html', form=form)
 
-@app.route('/artists/create', methods=['POST'])
+@main.route('/artists/create', methods=['POST'])
 def create_artist_submission():
   # called upon submitting the new artist listing form
   # TODO: insert form data as a new Venue record in the db, instead
@@ -415,6 +1368,9 @@ def create_artist_submission():
     
     db.session.add(artist)
     db.session.commit()
+    suggest_name(name_index('artists'), artist.id, artist.name)
+    match_index('artists').upsert(artist.id, artist.genres, artist.city, artist.state, artist.seeking_venue)
+    page_cache.invalidate('artists')
     flash('Artist ' + request.form['name'] + ' was successfully listed!')
   except:
     db.session.rollback()
@@ -431,51 +1387,97 @@ def create_artist_submission():
 #  Shows
 #  ----------------------------------------------------------------
 
-@app.route('/shows')
+@main.route('/shows')
+@read_only
+@conditional(shows_validator)
+@page_cache.cached('shows')
 def shows():
-  # displays list of shows at /shows
-  # TODO: replace with real venues data.
-  #       num_shows should be aggregated based on number of upcoming shows per venue.
-  shows = Shows.query.order_by('id').all()
-  data=[]
-  for d in shows:
-    venue = Venue.query.filter_by(id=d.venues[0].id).first()
-    artist = Artist.query.filter_by(id=d.artists[0].id).first()
-    datax={
-      "artist_id": artist.id,
-      "artist_name": artist.name,
-      "artist_image_link": artist.image_link,
-      "venue_id": venue.id,
-      "venue_name": venue.name,
-      "start_time": d.start_time
-    }
-    data.append(datax)
-  return render_template('pages/shows.html', shows=data)
-
-@app.route('/shows/create')
+  # displays list of shows at /shows, one page at a time. Pages are keyed on
+  # (start_time, id) so every page is a single indexed range scan, no matter
+  # how deep into the show history it is.
+  per_page = request.args.get('per_page', current_app.config['SHOWS_PER_PAGE'], type=int)
+  per_page = max(1, min(per_page, current_app.config['SHOWS_MAX_PER_PAGE']))
+  after = request.args.get('after')
+  before = request.args.get('before')
+  upcoming = request.args.get('upcoming') == '1'
+  q = shows_query()
+  if upcoming:
+    q = q.filter(upcoming_shows())
+  try:
+    if before:
+      q = q.filter(cursor_filter(before, before=True)).order_by(Shows.start_time.desc(), Shows.id.desc())
+    elif after:
+      q = q.filter(cursor_filter(after)).order_by(Shows.start_time, Shows.id)
+    else:
+      q = q.order_by(Shows.start_time, Shows.id)
+  except ValueError:
+    abort(400)
+  rows = q.limit(per_page + 1).all()
+  more = len(rows) > per_page
+  rows = rows[:per_page]
+  if before:
+    rows.reverse()
+  data = [{
+    "artist_id": d.artist_id,
+    "artist_name": d.artist_name,
+    "artist_image_link": d.artist_image_link,
+    "venue_id": d.venue_id,
+    "venue_name": d.venue_name,
+    "start_time": d.start_time
+  } for d in rows]
+  next_cursor = prev_cursor = None
+  if rows:
+    if more or before:
+      next_cursor = encode_cursor(rows[-1])
+    if (more and before) or after:
+      prev_cursor = encode_cursor(rows[0])
+  return render_template('pages/shows.html', shows=data, per_page=per_page, upcoming=upcoming,
+                         next_cursor=next_cursor, prev_cursor=prev_cursor)
+
+@main.route('/shows/create')
 def create_shows():
   # renders form. do not touch.
+  # the artist and venue pickers fetch their options from /api/lookup
   form = ShowForm()
-  artists = Artist.query.order_by('name').all()
-  venues = Venue.query.order_by('name').all()
-  return render_template('forms/new_show.html', form=form,artists=artists,venues=venues)
+  return render_template('forms/new_show.html', form=form)
 
-@app.route('/shows/create', methods=['POST'])
+@main.route('/shows/create', methods=['POST'])
 def create_show_submission():
   # called to create new shows in the db, upon submitting new show listing form
   # TODO: insert form data as a new Show record in the db, instead
   try:
     v_id = int(request.form.get('venue_id',''))
     a_id = int(request.form.get('artist_id',''))
-    
-    sh = Shows(start_time=request.form['start_time'])
-    ven = Venue.query.filter_by(id=v_id).first()
-    art = Artist.query.filter_by(id=a_id).first()
-    sh.artists = [art]
-    sh.venues = [ven]
+    known = db.session.query(db.session.query(Artist.id).filter_by(id=a_id).exists(),
+                             db.session.query(Venue.id).filter_by(id=v_id).exists()).one()
+    if not all(known):
+      raise ValueError('unknown artist or venue')
+    start_time = dateutil.parser.parse(request.form['start_time'])
+    occurrences = request.form.get('occurrences', 1, type=int)
+    # only the form's own rules: a posted one could carry its own COUNT, or
+    # never produce a date and keep rrule searching
+    repeat = request.form.get('repeat', '')
+    if repeat not in dict(SHOW_REPEATS):
+      raise ValueError('unknown repeat rule')
+    if repeat and occurrences > current_app.config['SERIES_MAX_SHOWS']:
+      raise SeriesTooLong('a series may have at most %d shows' % current_app.config['SERIES_MAX_SHOWS'])
+    if repeat and occurrences > 1:
+      # a residency: the whole series goes in with one multi-row INSERT
+      booked = create_series(a_id, v_id, start_time, '%s;COUNT=%d' % (repeat, occurrences))
+    else:
+      if booking_conflicts(db.session, [{"artist_id": a_id, "venue_id": v_id, "start_time": start_time}]):
+        raise BookingConflict('the venue or artist is already booked at that time')
+      db.session.add(Shows(start_time=start_time, artist_id=a_id, venue_id=v_id))
+      booked = 1
     db.session.commit()
-    
+    page_cache.invalidate(*show_pages(a_id, v_id))
+    match_index('artists').add_shows({a_id: booked})
+    match_index('venues').add_shows({v_id: booked})
+
     flash('Show was successfully listed!')
+  except (BookingConflict, SeriesTooLong) as e:
+    db.session.rollback()
+    flash('Show could not be listed: %s.' % e)
   except:
     db.session.rollback()
     flash('An error occurred. Show could not be listed.')
@@ -489,16 +1491,373 @@ def create_show_submission():
   # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
   return render_template('pages/home.html')
 
-@app.errorhandler(404)
+#  Search suggestions
+#  ----------------------------------------------------------------
+
+@main.route('/api/search/suggest')
+def search_suggest():
+  # name completions for the search boxes, served from the in-memory indexes
+  q = request.args.get('q', '')
+  limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+  rebuild_suggestions()
+  return jsonify({kind: name_index(kind).lookup(q, limit) for kind in SUGGESTED})
+
+#  Show form pickers
+#  ----------------------------------------------------------------
+
+@main.route('/api/lookup/<any(artists, venues):kind>')
+@read_only
+def lookup(kind):
+  # One page of picker options: names with words starting with the words of
+  # ?q=, in name order. ?after= takes the "next" cursor of the previous page.
+  model = Artist if kind == 'artists' else Venue
+  limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+  q = db.session.query(model.id, model.name, model.city, model.state).order_by(model.name, model.id)
+  tsquery = prefix_tsquery(request.args.get('q', ''), 'A')
+  if tsquery is not None:
+    q = q.filter(model.search_vector.op('@@')(tsquery))
+  after = request.args.get('after')
+  if after:
+    name, _, last_id = after.rpartition('~')
+    if not last_id.isdigit():
+      abort(400)
+    q = q.filter(db.tuple_(model.name, model.id) > (name, int(last_id)))
+  rows = q.limit(limit + 1).all()
+  return jsonify({
+    "results": [{
+      "id": r.id,
+      "name": r.name,
+      "city": r.city,
+      "state": r.state
+    } for r in rows[:limit]],
+    "next": '%s~%d' % (rows[limit - 1].name, rows[limit - 1].id) if len(rows) > limit else None
+  })
+
+#  JSON API
+#  ----------------------------------------------------------------
+
+# /api/v1: venues, artists and shows as JSON. ?fields=a,b picks the fields,
+# collections are keyset-paginated (?limit=, ?after= taking the "next" of the
+# previous page) and streamed. The objects come from the same queries as the
+# HTML pages.
+
+def api_error(status, message):
+  abort(make_response(jsonify({"error": message}), status))
+
+def api_fields(allowed):
+  fields = [f for f in request.args.get('fields', '').split(',') if f]
+  unknown = [f for f in fields if f not in allowed]
+  if unknown:
+    api_error(400, 'unknown fields: ' + ', '.join(unknown))
+  return fields or list(allowed)
+
+def api_limit():
+  limit = request.args.get('limit', current_app.config['API_PER_PAGE'], type=int)
+  return max(1, min(limit, current_app.config['API_MAX_PER_PAGE']))
+
+def api_stream(query, fields, limit, cursor):
+  # {"data": [...], "next": ...}, sent a chunk of objects at a time so a big
+  # page is never held in memory as one list or one string
+  def generate():
+    yield '{"data":['
+    chunk = []
+    sent = 0
+    last = more = None
+    for row in query.limit(limit + 1).execution_options(stream_results=True).yield_per(500):
+      if sent + len(chunk) == limit:
+        more = True
+        break
+      chunk.append(dumps({f: getattr(row, f) for f in fields}))
+      last = row
+      if len(chunk) == 200:
+        yield (',' if sent else '') + ','.join(chunk)
+        sent += len(chunk)
+        chunk = []
+    if chunk:
+      yield (',' if sent else '') + ','.join(chunk)
+    yield '],"next":%s}' % dumps(cursor(last) if more else None)
+  return Response(stream_with_context(generate()), mimetype='application/json')
+
+def api_entities(model, allowed):
+  fields = api_fields(allowed)
+  q = db.session.query(model.id, *[getattr(model, f) for f in fields if f != 'id']).order_by(model.id)
+  after = request.args.get('after')
+  if after:
+    if not after.isdigit():
+      api_error(400, 'bad cursor')
+    q = q.filter(model.id > int(after))
+  return api_stream(q, fields, api_limit(), lambda row: str(row.id))
+
+@main.route('/api/v1/venues')
+@read_only
+def api_venues():
+  return api_entities(Venue, VENUE_FIELDS)
+
+@main.route('/api/v1/venues/<int:venue_id>')
+@read_only
+def api_venue(venue_id):
+  return Response(dumps(venue_detail(venue_id, api_fields(VENUE_FIELDS + SHOW_LIST_FIELDS))),
+                  mimetype='application/json')
+
+@main.route('/api/v1/artists')
+@read_only
+def api_artists():
+  return api_entities(Artist, ARTIST_FIELDS)
+
+@main.route('/api/v1/artists/<int:artist_id>')
+@read_only
+def api_artist(artist_id):
+  return Response(dumps(artist_detail(artist_id, api_fields(ARTIST_FIELDS + SHOW_LIST_FIELDS))),
+                  mimetype='application/json')
+
+def api_delete(model):
+  # Bulk cleanup, e.g. of stale partner data:
+  # {"ids": [1, 2]} and/or {"external_ids": ["p-17"]} -> {"deleted": [1, 2]}
+  body = request.get_json(silent=True)
+  if not isinstance(body, dict):
+    api_error(400, 'expected a JSON object')
+  ids = body.get('ids') or []
+  external_ids = body.get('external_ids') or []
+  if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+    api_error(400, 'ids must be a list of integers')
+  if not isinstance(external_ids, list) or not all(isinstance(e, str) for e in external_ids):
+    api_error(400, 'external_ids must be a list of strings')
+  if not ids and not external_ids:
+    api_error(400, 'nothing to delete')
+  if len(ids) + len(external_ids) > current_app.config['API_MAX_BULK']:
+    api_error(400, 'at most %d entries per request' % current_app.config['API_MAX_BULK'])
+  deleted = delete_entities(model, ids, external_ids)
+  return jsonify({"deleted": [entity_id for entity_id, _ in deleted]})
+
+@main.route('/api/v1/venues', methods=['DELETE'])
+def api_delete_venues():
+  return api_delete(Venue)
+
+@main.route('/api/v1/artists', methods=['DELETE'])
+def api_delete_artists():
+  return api_delete(Artist)
+
+@main.route('/api/v1/shows')
+@read_only
+def api_shows():
+  # in start time order; ?venue_id= / ?artist_id= narrow it to one venue/artist
+  # and ?upcoming=1 to the shows that have not started
+  fields = api_fields(SHOW_FIELDS)
+  q = shows_query().order_by(Shows.start_time, Shows.id)
+  for name in ('venue_id', 'artist_id'):
+    value = request.args.get(name, type=int)
+    if value is not None:
+      q = q.filter(getattr(Shows, name) == value)
+  if request.args.get('upcoming') == '1':
+    q = q.filter(upcoming_shows())
+  after = request.args.get('after')
+  if after:
+    try:
+      q = q.filter(cursor_filter(after))
+    except ValueError:
+      api_error(400, 'bad cursor')
+  return api_stream(q, fields, api_limit(), encode_cursor)
+
+@main.route('/api/v1/shows', methods=['POST'])
+def api_create_shows():
+  # Partner feeds: {"shows": [{"artist", "venue", "start_time", "external_id"}]}
+  # with the same fields as `flask import shows`. The batch is resolved with
+  # one query per side and inserted with one COPY and one INSERT; shows whose
+  # external_id exists already are skipped.
+  body = request.get_json(silent=True)
+  shows = body.get('shows') if isinstance(body, dict) else None
+  if not isinstance(shows, list) or not all(isinstance(show, dict) for show in shows):
+    api_error(400, 'expected {"shows": [...]}')
+  if len(shows) > current_app.config['API_MAX_BULK']:
+    api_error(400, 'at most %d entries per request' % current_app.config['API_MAX_BULK'])
+  convert = importer.show_converter(Artist.__table__, Venue.__table__, conflicts=booking_conflicts)
+  inserted = 0
+  with db.engine.begin() as conn:
+    rows, rejected = convert(shows, conn)
+    if rows:
+      inserted = importer.copy_insert(conn, Shows.__table__, rows)
+  if rows:
+    page_cache.invalidate('venues', 'shows', *{'venue:%d' % r["venue_id"] for r in rows}
+                          | {'artist:%d' % r["artist_id"] for r in rows})
+    match_index('artists').add_shows(Counter(r["artist_id"] for r in rows))
+    match_index('venues').add_shows(Counter(r["venue_id"] for r in rows))
+  position = {id(show): i for i, show in enumerate(shows)}
+  return jsonify({
+    "inserted": inserted,
+    "rejected": [{"index": position[id(show)], "error": reason} for show, reason in rejected]
+  })
+
+#  Page cache statistics
+#  ----------------------------------------------------------------
+
+@main.route('/api/cache/stats')
+def cache_stats():
+  return jsonify(page_cache.stats())
+
+@main.route('/api/db/pool')
+def db_pool_stats():
+  engines = {"primary": db.get_engine()}
+  for bind in current_app.config['SQLALCHEMY_BINDS'] or ():
+    engines[bind] = db.get_engine(bind=bind)
+  return jsonify({name: pool_stats(engine) for name, engine in engines.items()})
+
+@main.route('/metrics')
+def metrics_page():
+  return Response(metrics.expose(), mimetype='text/plain; version=0.0.4')
+
+@main.app_errorhandler(404)
 def not_found_error(error):
+    if request.path.startswith('/api/'):
+        return jsonify({"error": "not found"}), 404
     return render_template('errors/404.html'), 404
 
-@app.errorhandler(500)
+@main.app_errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+@main.cli.command('import')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=5000, show_default=True, help='rows per INSERT and transaction')
+@click.option('--restart', is_flag=True, help='ignore the checkpoint of an earlier, failed run')
+def import_command(kind, path, batch_size, restart):
+  """Stream venues, artists or shows from a .csv or .jsonl file."""
+  if kind == 'venues':
+    table, convert = Venue.__table__, importer.entity_converter(Venue.__table__, flags=('seeking_talent',))
+  elif kind == 'artists':
+    table, convert = Artist.__table__, importer.entity_converter(Artist.__table__, flags=('seeking_venue',))
+  else:
+    table, convert = Shows.__table__, importer.show_converter(Artist.__table__, Venue.__table__,
+                                                              conflicts=booking_conflicts)
+  importer.import_file(db.engine, table, path, convert, batch_size, restart, echo=click.echo)
+
+@main.cli.command('roll-show-counts')
+def roll_show_counts_command():
+  """Move shows that have started from the upcoming to the past counters."""
+  click.echo('%d shows rolled over' % roll_show_counts())
+
+@main.cli.command('rebuild-show-counts')
+def rebuild_show_counts_command():
+  """Recount the upcoming and past shows of every venue and artist."""
+  rebuild_show_counts()
+  click.echo('show counts rebuilt')
+
+@main.cli.command('show-partitions')
+@click.option('--ahead', type=int, help='years after this one to create [SHOW_PARTITIONS_AHEAD]')
+@click.option('--archive-before', type=int, metavar='YEAR', help='archive the partitions of the past years before YEAR')
+def show_partitions_command(ahead, archive_before):
+  """Create the show partitions of the coming years and archive old ones."""
+  if ahead is None:
+    ahead = current_app.config['SHOW_PARTITIONS_AHEAD']
+  for year in create_show_partitions(ahead):
+    click.echo('created Shows_%d' % year)
+  if archive_before is not None:
+    for year in archive_show_partitions(archive_before):
+      click.echo('archived Shows_%d to %s.Shows_%d' % (year, SHOW_ARCHIVE_SCHEMA, year))
+
+@main.cli.command('compile-templates')
+def compile_templates_command():
+  """Compile every template into TEMPLATE_CACHE_DIR, e.g. at deploy."""
+  click.echo('%d templates compiled' % compile_templates(current_app))
+
+@main.cli.command('profile-token')
+def profile_token_command():
+  """Print a token for the X-Profile header."""
+  click.echo(request_profiler.token())
+
+@main.cli.command('profile-report')
+@click.argument('pattern', default='*')
+@click.option('--sort', default='cumulative', show_default=True, help='pstats sort key, e.g. tottime')
+@click.option('--limit', default=30, show_default=True)
+def profile_report_command(pattern, sort, limit):
+  """Merge the saved profiles matching PATTERN and print the hot spots."""
+  if not profiler.report(current_app.config.get('PROFILE_DIR', 'profiles'), pattern, sort, limit):
+    click.echo('no profiles match %r' % pattern)
+
+#----------------------------------------------------------------------------#
+# App factory.
+#----------------------------------------------------------------------------#
+
+def env_overrides(config):
+  # FYYUR_<SETTING> environment variables override any setting of config.py.
+  # Values are read as JSON when they parse (FYYUR_QUERY_BUDGET=50,
+  # FYYUR_CACHE_BACKEND=null) and as plain strings otherwise.
+  overrides = {}
+  for key in config:
+    value = os.environ.get('FYYUR_' + key)
+    if value is not None:
+      try:
+        overrides[key] = json.loads(value)
+      except ValueError:
+        overrides[key] = value
+  return overrides
+
+def dispose_engines(app):
+  # Pooled connections must never be shared across fork(): drop them in the
+  # parent right before it forks, so that every worker opens its own.
+  with app.app_context():
+    db.get_engine(app).dispose()
+    for bind in app.config['SQLALCHEMY_BINDS'] or ():
+      db.get_engine(app, bind=bind).dispose()
+
+# Apps whose engines are disposed of before every fork, by one hook for the
+# whole process. Apps that are gone drop out of the set.
+forking_apps = weakref.WeakSet()
+
+def dispose_forking_apps():
+  for app in list(forking_apps):
+    dispose_engines(app)
+
+if hasattr(os, 'register_at_fork'):
+  os.register_at_fork(before=dispose_forking_apps)
+
+def compile_templates(app):
+  # Compile every template into the app's Jinja environment (and the bytecode
+  # cache, when there is one). Run in a preloading master, the workers fork
+  # with all templates compiled. Returns the number of templates.
+  names = app.jinja_env.list_templates(extensions=['html'])
+  for name in names:
+    app.jinja_env.get_template(name)
+  return len(names)
+
+def create_app(config=None):
+  """Build the app from config.py, then FYYUR_* environment variables, then
+  `config` (an object or a dict), each overriding the one before."""
+  app = Flask(__name__)
+  app.config.from_object('config')
+  app.config.update(env_overrides(app.config))
+  if isinstance(config, dict):
+    app.config.update(config)
+  elif config is not None:
+    app.config.from_object(config)
+  if not app.config.get('SECRET_KEY'):
+    raise RuntimeError('SECRET_KEY is not set; all workers must share one to read each other\'s sessions')
+
+  db.init_app(app)
+  moment.init_app(app)
+  migrate.init_app(app, db)
+  page_cache.init_app(app)
+  # this app's in-memory indexes and caches (see the sections using them)
+  codes = Codes()
+  app.extensions['suggestions'] = {kind: PrefixIndex() for kind in SUGGESTED}
+  app.extensions['matches'] = {kind: MatchIndex(GENRES, codes) for kind in MATCHED}
+  app.extensions['genre_facets'] = {}
+  app.extensions['show_counts_rolled'] = 0.0
+  request_profiler.init_app(app)
+  app.register_blueprint(main)
+  if app.config['TEMPLATE_CACHE_DIR']:
+    os.makedirs(app.config['TEMPLATE_CACHE_DIR'], exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['TEMPLATE_CACHE_DIR'])
+
+  forking_apps.add(app)
+
+  # app.logger is shared by every app of this module; it gets one handler
+  if not app.debug and not any(isinstance(h, FileHandler) for h in app.logger.handlers):
     file_handler = FileHandler('error.log')
     file_handler.setFormatter(
         Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
@@ -507,6 +1866,7 @@ if not app.debug:
     file_handler.setLevel(logging.INFO)
     app.logger.addHandler(file_handler)
     app.logger.info('errors')
+  return app
 
 #----------------------------------------------------------------------------#
 # Launch.
@@ -514,11 +1874,11 @@ if not app.debug:
 
 # Default port:
 if __name__ == '__main__':
-    app.run()
+    create_app().run()
 
 # Or specify port manually:
 '''
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
 '''
\ No newline at end of file
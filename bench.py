@@ -0,0 +1,407 @@
+"""Synthetic data and route benchmarks.
+
+    $ python bench.py generate --venues 2000 --artists 10000 --shows 200000
+    $ python bench.py run --output bench.json
+    $ python bench.py run --output new.json --compare bench.json
+
+`generate` fills the configured database with reproducible fake venues,
+artists and shows (all with a "bench-" external_id, and `--clear` removes
+them again). `run` drives every route through the Flask test client and
+writes p50/p95 latency, SQL statements and rows fetched per route as JSON;
+with `--compare` it exits non-zero when a route got slower or chattier than
+in the earlier report. The write routes work on throwaway rows that are
+removed after every request, so each iteration sees the same data.
+"""
+import json
+import random
+import statistics
+import subprocess
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import click
+import pytz
+from flask import has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from werkzeug.urls import url_encode
+
+import importer
+from app import create_app, db, Venue, Artist, Shows, ShowSeries
+from forms import genres_list, state_list
+
+app = create_app()
+
+
+GENRES = [g.value for g in genres_list]
+STATES = [s.value for s in state_list]
+WORDS = ['Blue', 'Red', 'Velvet', 'Neon', 'Golden', 'Iron', 'Silver', 'Electric',
+         'Moon', 'River', 'Garden', 'Echo', 'Harbor', 'Static', 'Wild', 'Lucky']
+
+
+def load(table, rows, convert, batch_size=5000):
+    # the fake rows are all valid; a rejected one means generate and the
+    # converters disagree, so stop rather than benchmark a partial data set
+    for batch in importer.batches(rows, batch_size):
+        with db.engine.begin() as conn:
+            values, rejected = convert(batch, conn)
+            if rejected:
+                row, reason = rejected[0]
+                raise click.ClickException('%d %s rows rejected, e.g. %r: %s'
+                                           % (len(rejected), table.name, row, reason))
+            if values:
+                importer.copy_insert(conn, table, values)
+
+
+def fake_entities(rng, kind, count, cities):
+    for i in range(count):
+        city, state = rng.choice(cities)
+        row = {
+            "external_id": 'bench-%s-%d' % (kind, i),
+            "name": '%s %s %d' % (rng.choice(WORDS), rng.choice(WORDS), i),
+            "city": city,
+            "state": state,
+            "phone": '%03d-%03d-%04d' % (rng.randrange(1000), rng.randrange(1000), rng.randrange(10000)),
+            "genres": rng.sample(GENRES, rng.randint(1, 3)),
+            "image_link": 'https://example.com/%s/%d.jpg' % (kind, i),
+            "seeking_description": None
+        }
+        if kind == 'venue':
+            row["address"] = '%d %s Street' % (rng.randrange(1, 9999), rng.choice(WORDS))
+            row["seeking_talent"] = rng.random() < 0.3
+        else:
+            row["seeking_venue"] = rng.random() < 0.3
+        yield row
+
+
+def fake_shows(rng, count, venues, artists, years_back, years_ahead):
+    # venue and artist popularity is heavy-tailed, like the real data: a few
+    # busy venues carry most of the shows
+    now = datetime.now(pytz.UTC)
+    span = (years_back + years_ahead) * 365 * 24 * 3600
+    for i in range(count):
+        yield {
+            "external_id": 'bench-show-%d' % i,
+            "venue": 'bench-venue-%d' % (int((rng.paretovariate(1.2) - 1) * venues / 20) % venues),
+            "artist": 'bench-artist-%d' % rng.randrange(artists),
+            "start_time": (now - timedelta(days=365 * years_back)
+                           + timedelta(seconds=rng.randrange(span))).isoformat()
+        }
+
+
+@click.group()
+def cli():
+    pass
+
+
+@cli.command()
+@click.option('--venues', default=1000, show_default=True)
+@click.option('--artists', default=5000, show_default=True)
+@click.option('--shows', default=50000, show_default=True)
+@click.option('--cities', default=200, show_default=True)
+@click.option('--years-back', default=3, show_default=True)
+@click.option('--years-ahead', default=1, show_default=True)
+@click.option('--seed', default=42, show_default=True, help='same seed, same data')
+@click.option('--clear', is_flag=True, help='only delete earlier bench data')
+def generate(venues, artists, shows, cities, years_back, years_ahead, seed, clear):
+    """Fill the database with synthetic venues, artists and shows."""
+    with app.app_context():
+        for model in (Shows, Venue, Artist):
+            model.query.filter(model.external_id.like('bench-%')).delete(synchronize_session=False)
+        db.session.commit()
+        if clear:
+            return
+        rng = random.Random(seed)
+        places = [('City %d' % i, rng.choice(STATES)) for i in range(cities)]
+        started = time.time()
+        load(Venue.__table__, fake_entities(rng, 'venue', venues, places),
+             importer.entity_converter(Venue.__table__, flags=('seeking_talent',)))
+        load(Artist.__table__, fake_entities(rng, 'artist', artists, places),
+             importer.entity_converter(Artist.__table__, flags=('seeking_venue',)))
+        load(Shows.__table__, fake_shows(rng, shows, venues, artists, years_back, years_ahead),
+             importer.show_converter(Artist.__table__, Venue.__table__))
+        db.session.execute('ANALYZE')
+        db.session.commit()
+        click.echo('generated %d venues, %d artists, %d shows in %.1fs'
+                   % (venues, artists, shows, time.time() - started))
+
+
+# url may hold {fields} filled in by prepare(), which runs before each
+# request; reset() runs after it. Neither is timed or counted.
+Route = namedtuple('Route', 'name method url data json prepare reset', defaults=(None,) * 4)
+
+# Venues and artists the write routes create or delete are named WRITE_NAME;
+# the shows they book go to a scratch venue and artist. reset_writes()
+# removes all of them, and `generate --clear` the scratch pair too.
+WRITE_NAME = 'Bench Write'
+WRITE_SHOWS = 20
+EDITED = ('name', 'city', 'state', 'phone', 'genres', 'facebook_link', 'seeking_description',
+          'image_link', 'website')
+
+
+def scratch_pair():
+    ids = []
+    for model, kind in ((Venue, 'venue'), (Artist, 'artist')):
+        row = model.query.filter_by(external_id='bench-write-' + kind).first()
+        if row is None:
+            row = model(external_id='bench-write-' + kind, name='Bench Scratch', city='City 0',
+                        state=STATES[0], genres=[GENRES[0]])
+            db.session.add(row)
+            db.session.flush()
+        ids.append(row.id)
+    db.session.commit()
+    return ids
+
+
+def seed(model, venue_id, artist_id):
+    # a venue or artist with WRITE_SHOWS past shows, for a delete route
+    kind = 'venue' if model is Venue else 'artist'
+    row = model(external_id='bench-write-%s-seed' % kind, name=WRITE_NAME, city='City 0',
+                state=STATES[0], genres=[GENRES[0]])
+    db.session.add(row)
+    db.session.flush()
+    now = datetime.now(pytz.UTC)
+    db.session.execute(Shows.__table__.insert(), [{
+        "venue_id": row.id if model is Venue else venue_id,
+        "artist_id": row.id if model is Artist else artist_id,
+        "start_time": now - timedelta(days=i + 1)
+    } for i in range(WRITE_SHOWS)])
+    db.session.commit()
+    return {"id": row.id}
+
+
+def reset_writes(venue_id, artist_id):
+    for model in (Venue, Artist):
+        model.query.filter(model.name == WRITE_NAME).delete(synchronize_session=False)
+    ShowSeries.query.filter(db.or_(ShowSeries.venue_id == venue_id, ShowSeries.artist_id == artist_id)) \
+        .delete(synchronize_session=False)
+    Shows.query.filter(Shows.venue_id == venue_id).delete(synchronize_session=False)
+    Shows.query.filter(Shows.artist_id == artist_id).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def edit_route(name, model, entity_id, flag):
+    # posts the row's own values back; reset puts back exactly what was
+    # there (NULL rather than the form's empty strings)
+    row = model.query.get(entity_id)
+    values = {column: getattr(row, column) for column in EDITED + (flag,)}
+    if model is Venue:
+        values["address"] = row.address
+    form = {column: value or '' for column, value in values.items()}
+    form[flag] = 'true' if values[flag] else 'false'
+
+    def reset():
+        model.query.filter_by(id=entity_id).update(values, synchronize_session=False)
+        db.session.commit()
+    url = '/%ss/%d/edit' % ('venue' if model is Venue else 'artist', entity_id)
+    return Route(name, 'POST', url, data=form, reset=reset)
+
+
+def routes():
+    # Route()s for every page, using the busiest venue, a typical artist and
+    # a cursor from the middle of the show history
+    busy = db.session.query(Shows.venue_id).group_by(Shows.venue_id) \
+        .order_by(db.func.count().desc()).limit(1).scalar() or 1
+    artist = db.session.query(Shows.artist_id).order_by(Shows.id).limit(1).scalar() or 1
+    middle = Shows.query.order_by(Shows.start_time, Shows.id) \
+        .offset(Shows.query.count() // 2).first()
+    cursor = '%s~%d' % (middle.start_time.isoformat(), middle.id) if middle else ''
+    venue_id, artist_id = scratch_pair()
+    reset = lambda: reset_writes(venue_id, artist_id)
+    start = (datetime.now(pytz.UTC) + timedelta(days=30)).replace(hour=20, minute=0, second=0, microsecond=0)
+    show = {'venue_id': venue_id, 'artist_id': artist_id, 'start_time': start.strftime('%Y-%m-%d %H:%M')}
+    entity = {'name': WRITE_NAME, 'city': 'City 0', 'state': STATES[0], 'phone': '', 'genres': GENRES[0],
+              'facebook_link': '', 'seeking_description': '', 'image_link': '', 'website': ''}
+    partner_shows = {"shows": [{
+        "artist": 'bench-write-artist',
+        "venue": 'bench-write-venue',
+        "start_time": (start + timedelta(days=i)).isoformat(),
+        "external_id": 'bench-write-show-%d' % i
+    } for i in range(100)]}
+    return [
+        Route('index', 'GET', '/'),
+        Route('venues', 'GET', '/venues'),
+        Route('artists', 'GET', '/artists'),
+        Route('shows', 'GET', '/shows'),
+        Route('shows_deep_page', 'GET', '/shows?' + url_encode({'after': cursor})),
+        Route('shows_upcoming', 'GET', '/shows?upcoming=1'),
+        Route('show_venue_busy', 'GET', '/venues/%d' % busy),
+        Route('show_artist', 'GET', '/artists/%d' % artist),
+        Route('suggested_venues', 'GET', '/artists/%d/suggested-venues' % artist),
+        Route('venue_availability', 'GET', '/venues/%d/availability' % busy),
+        Route('search_venues', 'POST', '/venues/search', data={'search_term': 'blue'}),
+        Route('search_artists', 'POST', '/artists/search', data={'search_term': 'velvet moon'}),
+        Route('search_suggest', 'GET', '/api/search/suggest?q=gol'),
+        Route('create_show_form', 'GET', '/shows/create'),
+        Route('create_venue_form', 'GET', '/venues/create'),
+        Route('create_artist_form', 'GET', '/artists/create'),
+        Route('lookup_artists', 'GET', '/api/lookup/artists?q=blue'),
+        Route('lookup_venues', 'GET', '/api/lookup/venues?q=blue'),
+        Route('api_venues', 'GET', '/api/v1/venues?limit=1000'),
+        Route('api_artists', 'GET', '/api/v1/artists?limit=1000'),
+        Route('api_artist', 'GET', '/api/v1/artists/%d' % artist),
+        Route('api_shows', 'GET', '/api/v1/shows?limit=1000&fields=id,start_time,artist_id,venue_id'),
+        Route('api_venue', 'GET', '/api/v1/venues/%d' % busy),
+        Route('api_venue_upcoming', 'GET', '/api/v1/venues/%d?fields=name,upcoming_shows' % busy),
+        Route('suggested_artists', 'GET', '/venues/%d/suggested-artists' % busy),
+        Route('edit_venue_form', 'GET', '/venues/%d/edit' % busy),
+        Route('edit_artist_form', 'GET', '/artists/%d/edit' % artist),
+        Route('metrics', 'GET', '/metrics'),
+        Route('cache_stats', 'GET', '/api/cache/stats'),
+        Route('db_pool', 'GET', '/api/db/pool'),
+        Route('create_venue', 'POST', '/venues/create', data=dict(entity, address='1 Main Street', seeking_talent='false'),
+              reset=reset),
+        Route('create_artist', 'POST', '/artists/create', data=dict(entity, seeking_venue='false'), reset=reset),
+        edit_route('edit_venue_busy', Venue, busy, 'seeking_talent'),
+        edit_route('edit_artist', Artist, artist, 'seeking_venue'),
+        Route('create_show', 'POST', '/shows/create', data=show, reset=reset),
+        Route('create_show_series', 'POST', '/shows/create', data=dict(show, repeat='FREQ=WEEKLY', occurrences=52),
+              reset=reset),
+        Route('api_create_shows', 'POST', '/api/v1/shows', json=partner_shows, reset=reset),
+        Route('delete_venue', 'DELETE', '/venues/{id}', prepare=lambda: seed(Venue, venue_id, artist_id), reset=reset),
+        Route('delete_artist', 'DELETE', '/artists/{id}', prepare=lambda: seed(Artist, venue_id, artist_id),
+              reset=reset),
+        Route('api_delete_venues', 'DELETE', '/api/v1/venues', json={"external_ids": ['bench-write-venue-seed']},
+              prepare=lambda: seed(Venue, venue_id, artist_id), reset=reset),
+        Route('api_delete_artists', 'DELETE', '/api/v1/artists', json={"external_ids": ['bench-write-artist-seed']},
+              prepare=lambda: seed(Artist, venue_id, artist_id), reset=reset),
+    ]
+
+
+class CountingCursor(object):
+    """Stands in for a server-side (named) cursor, whose rows are fetched
+    after execute, in batches, and counts the rows it hands out."""
+
+    def __init__(self, cursor, stats):
+        self._cursor = cursor
+        self._stats = stats
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._stats["rows"] += 1
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self._stats["rows"] += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._stats["rows"] += len(rows)
+        return rows
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))]
+
+
+@cli.command()
+@click.option('--iterations', default=20, show_default=True, help='timed requests per route')
+@click.option('--warmup', default=2, show_default=True)
+@click.option('--cache', is_flag=True, help='keep the page cache on (off by default)')
+@click.option('--output', type=click.Path(dir_okay=False), help='write the JSON report here')
+@click.option('--compare', type=click.Path(exists=True, dir_okay=False), help='earlier report to check against')
+@click.option('--tolerance', default=0.25, show_default=True, help='allowed p95 slowdown before failing')
+def run(iterations, warmup, cache, output, compare, tolerance):
+    """Time every route and report latency, queries and rows per route."""
+    stats = {"queries": 0, "rows": 0}
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            stats["queries"] += 1
+            if getattr(cursor, 'name', None):
+                # the result fetches from context.cursor, created after this
+                context.cursor = CountingCursor(cursor, stats)
+            elif cursor.description is not None:
+                stats["rows"] += max(cursor.rowcount, 0)
+
+    if not cache:
+        app.extensions['page_cache'] = None
+    client = app.test_client()
+    report = {"meta": meta(iterations, cache), "routes": {}}
+    with app.app_context():
+        targets = routes()
+    for route in targets:
+        timings = []
+        for i in range(warmup + iterations):
+            url = route.url
+            if route.prepare is not None:
+                with app.app_context():
+                    url = url.format(**route.prepare())
+            stats["queries"] = stats["rows"] = 0
+            started = time.perf_counter()
+            response = client.open(url, method=route.method, data=route.data, json=route.json, buffered=True)
+            elapsed = (time.perf_counter() - started) * 1000
+            if route.reset is not None:
+                with app.app_context():
+                    route.reset()
+            if i >= warmup:
+                timings.append(elapsed)
+        report["routes"][route.name] = {
+            "url": url,
+            "status": response.status_code,
+            "p50_ms": round(percentile(timings, 50), 2),
+            "p95_ms": round(percentile(timings, 95), 2),
+            "mean_ms": round(statistics.mean(timings), 2),
+            "queries": stats["queries"],
+            "rows": stats["rows"],
+            "bytes": len(response.data)
+        }
+        click.echo('%-18s %3d  p50 %8.2fms  p95 %8.2fms  %3d queries  %7d rows'
+                   % (route.name, response.status_code, report["routes"][route.name]["p50_ms"],
+                      report["routes"][route.name]["p95_ms"], stats["queries"], stats["rows"]))
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    if compare:
+        with open(compare) as f:
+            regressions = regressed(json.load(f), report, tolerance)
+        for line in regressions:
+            click.echo('REGRESSION ' + line)
+        if regressions:
+            sys.exit(1)
+
+
+def meta(iterations, cache):
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                         stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    with app.app_context():
+        volumes = {m.__tablename__: m.query.count() for m in (Venue, Artist, Shows)}
+    return {
+        "commit": commit,
+        "created": datetime.now(pytz.UTC).isoformat(),
+        "iterations": iterations,
+        "cache": cache,
+        "volumes": volumes
+    }
+
+
+def regressed(old, new, tolerance):
+    lines = []
+    for name, now in sorted(new["routes"].items()):
+        before = old["routes"].get(name)
+        if before is None:
+            continue
+        if now["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            lines.append('%s: p95 %.2fms -> %.2fms' % (name, before["p95_ms"], now["p95_ms"]))
+        if now["queries"] > before["queries"]:
+            lines.append('%s: %d -> %d queries' % (name, before["queries"], now["queries"]))
+        if now["status"] != before["status"]:
+            lines.append('%s: status %d -> %d' % (name, before["status"], now["status"]))
+    return lines
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,204 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, g, request, session, make_response
+from werkzeug.urls import url_encode
+
+
+class MemoryBackend(object):
+    """LRU of rendered pages with a TTL, private to one worker process.
+
+    Tag versions live in the same process, so a write only invalidates the
+    pages cached by the worker that served it; other workers catch up
+    within `ttl` seconds.
+    """
+
+    def __init__(self, max_entries=1000, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = self.misses = self.evictions = 0
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.time():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def versions(self, tags):
+        return [self._versions.get(tag, 0) for tag in tags]
+
+    def bump(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+
+    def stats(self):
+        return {
+            "backend": "memory",
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+
+class RedisBackend(object):
+    """Pages and tag versions shared by every worker through Redis.
+
+    Entries expire after `ttl` seconds and Redis' own maxmemory policy does
+    the evicting. Needs the optional `redis` package.
+    """
+
+    def __init__(self, url, ttl=60, prefix='fyyur:page:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, value, ex=self.ttl)
+
+    def versions(self, tags):
+        return [int(v or 0) for v in self.client.mget([self.prefix + 'v:' + t for t in tags])]
+
+    def bump(self, tags):
+        pipe = self.client.pipeline()
+        for tag in tags:
+            pipe.incr(self.prefix + 'v:' + tag)
+        pipe.execute()
+
+    def stats(self):
+        return {
+            "backend": "redis",
+            "entries": None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.client.info('stats').get('evicted_keys', 0)
+        }
+
+
+class PageCache(object):
+    """Caches the rendered HTML of GET views, keyed by path, query string and
+    the current version of every tag the view declares.
+
+    invalidate() bumps tag versions instead of hunting down keys, so a write
+    retires exactly the pages that carry its tags and the stale entries age
+    out of the backend on their own.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # the backend belongs to the app, so that every app made by
+        # create_app() keeps its own
+        kind = app.config.get('CACHE_BACKEND', 'memory')
+        ttl = app.config.get('CACHE_TTL', 60)
+        if kind == 'memory':
+            backend = MemoryBackend(app.config.get('CACHE_MAX_ENTRIES', 1000), ttl)
+        elif kind == 'redis':
+            backend = RedisBackend(app.config['CACHE_REDIS_URL'], ttl)
+        elif kind is None:
+            backend = None
+        else:
+            raise ValueError('unknown CACHE_BACKEND %r' % kind)
+        app.extensions['page_cache'] = backend
+
+    @property
+    def backend(self):
+        return current_app.extensions.get('page_cache')
+
+    def cached(self, *tags):
+        # tags are format strings filled from the view's arguments,
+        # e.g. @page_cache.cached('venue:{venue_id}')
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**kwargs):
+                # pages carrying a flashed message are personal, never shared;
+                # views may also set g.skip_page_cache for the request
+                backend = self.backend
+                if backend is None or '_flashes' in session or g.get('skip_page_cache'):
+                    return view(**kwargs)
+                names = [tag.format(**kwargs) for tag in tags]
+                key = '%s?%s|%s' % (request.path,
+                                    url_encode(sorted(request.args.items(multi=True))),
+                                    '.'.join(str(v) for v in backend.versions(names)))
+                body = backend.get(key)
+                if body is not None:
+                    response = make_response(body)
+                    response.headers['X-Cache'] = 'HIT'
+                    return response
+                response = make_response(view(**kwargs))
+                if response.status_code == 200 and response.is_streamed:
+                    response.response = self._tee(backend, key, response.response, response.charset,
+                                                  current_app.config.get('CACHE_MAX_PAGE_BYTES'))
+                elif response.status_code == 200:
+                    backend.set(key, response.get_data())
+                response.headers['X-Cache'] = 'MISS'
+                return response
+            return wrapper
+        return decorator
+
+    def _tee(self, backend, key, body, charset, max_page_bytes):
+        # Pass a streamed page through, keeping a copy for the cache as long
+        # as it stays under max_page_bytes; it is stored once fully sent
+        # (after the app context is gone, hence the arguments).
+        chunks = []
+        size = 0
+        try:
+            for chunk in body:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode(charset)
+                if chunks is not None:
+                    size += len(chunk)
+                    if max_page_bytes is not None and size > max_page_bytes:
+                        chunks = None
+                    else:
+                        chunks.append(chunk)
+                yield chunk
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+        if chunks is not None:
+            backend.set(key, b''.join(chunks))
+
+    def invalidate(self, *tags):
+        backend = self.backend
+        if backend is not None and tags:
+            backend.bump(tags)
+
+    def stats(self):
+        backend = self.backend
+        if backend is None:
+            return {"backend": None}
+        return backend.stats()
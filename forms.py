@@ -1,7 +1,7 @@
 from datetime import datetime
 from flask_wtf import Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField
-from wtforms.validators import DataRequired, AnyOf, URL
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, IntegerField
+from wtforms.validators import DataRequired, AnyOf, URL, NumberRange
 from enum import Enum
 
 
@@ -159,9 +159,29 @@ class ArtistForm(Form):
     )
 
 # TODO IMPLEMENT NEW ARTIST FORM AND NEW SHOW FORM
+# Recurrence rules a show can repeat by, without their COUNT, which comes
+# from occurrences. The only rules the show form accepts.
+SHOW_REPEATS = [
+    ('', 'Does not repeat'),
+    ('FREQ=DAILY', 'Daily'),
+    ('FREQ=WEEKLY', 'Weekly'),
+    ('FREQ=WEEKLY;INTERVAL=2', 'Every two weeks'),
+    ('FREQ=MONTHLY', 'Monthly'),
+]
+
 class ShowForm(Form):
     start_time = DateTimeField(
         'start_time',
         validators=[DataRequired()],
         default= datetime.today()
     )
+    repeat = SelectField(
+        'repeat',
+        choices=SHOW_REPEATS,
+        default=''
+    )
+    occurrences = IntegerField(
+        'occurrences',
+        validators=[NumberRange(min=1)],
+        default=1
+    )
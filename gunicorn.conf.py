@@ -0,0 +1,36 @@
+"""Gunicorn settings for running Fyyur on every core of a machine.
+
+    $ SECRET_KEY=... DATABASE_URL=... gunicorn -c gunicorn.conf.py wsgi:app
+
+Scale out by running this on more machines behind a load balancer: all
+workers share SECRET_KEY and the database, so any of them can serve any
+request. Every worker has its own connection pool, so keep
+workers x threads (per machine) x machines below what Postgres accepts.
+"""
+import multiprocessing
+import os
+
+bind = '0.0.0.0:' + os.environ.get('PORT', '8000')
+
+# CPU-bound rendering wants about two processes per core; threads help while
+# requests wait on Postgres.
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 2))
+worker_class = 'gthread'
+
+# Import the app once in the master and fork the workers from it: they start
+# faster and share the loaded code. create_app() drops pooled database
+# connections before every fork, so workers never share one.
+preload_app = True
+
+# Recycle workers now and then so slow leaks cannot build up; the jitter
+# keeps them from restarting all at once.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = max_requests // 10
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
@@ -0,0 +1,260 @@
+import csv
+import io
+import json
+import os
+import time
+from collections import namedtuple
+from datetime import datetime
+from itertools import islice
+
+import dateutil.parser
+from sqlalchemy import Column, Integer, MetaData, String, Table, any_, bindparam, exists, func, or_, select
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+
+
+# A .jsonl line that is not a JSON object; import_file rejects it.
+BadLine = namedtuple('BadLine', 'line reason')
+
+
+def read_rows(path):
+    # Stream dicts from a .csv file (with a header row) or a .jsonl file, one
+    # line at a time, so memory does not grow with the file. Unreadable lines
+    # come out as BadLine, so that they still count as rows for the checkpoint.
+    with open(path, newline='') as f:
+        if path.endswith('.csv'):
+            for row in csv.DictReader(f):
+                yield row
+        else:
+            for line in f:
+                if line.strip():
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        yield BadLine(line.strip(), 'bad JSON')
+                        continue
+                    if isinstance(row, dict):
+                        yield row
+                    else:
+                        yield BadLine(line.strip(), 'not a JSON object')
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def as_list(value):
+    # genres are a JSON list, or "Jazz;Folk" in a CSV cell
+    if isinstance(value, list):
+        return value
+    return [v.strip() for v in (value or '').split(';') if v.strip()]
+
+
+def as_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value or '').strip().lower() in ('1', 't', 'true', 'y', 'yes')
+
+
+def as_text(value):
+    # CSV has no NULL; an empty cell means "not set"
+    return value if value not in ('', None) else None
+
+
+def entity_converter(table, lists=('genres',), flags=()):
+    # Rows for Venue/Artist: copy the table's columns from the input row,
+    # turning list and flag columns into arrays and booleans.
+    columns = [c.name for c in table.columns
+               if c.name not in ('id', 'updated_at', 'search_vector', 'shows_changed_at',
+                                 'upcoming_shows_count', 'past_shows_count')]
+    required = ['external_id'] + [c.name for c in table.columns if c.name in columns
+                                  and not c.nullable and c.name not in lists + flags]
+
+    def convert(batch, conn):
+        rows = []
+        rejected = []
+        for row in batch:
+            missing = [name for name in required if not row.get(name)]
+            if missing:
+                rejected.append((row, 'missing ' + ', '.join(missing)))
+                continue
+            out = {}
+            for name in columns:
+                value = row.get(name)
+                if name in lists:
+                    out[name] = as_list(value)
+                elif name in flags:
+                    out[name] = as_bool(value)
+                else:
+                    out[name] = as_text(value)
+            rows.append(out)
+        return rows, rejected
+    return convert
+
+
+def key_map(conn, table, keys):
+    # one query per batch: external_id -> id for the keys the batch uses,
+    # passed as a single array parameter rather than thousands of binds
+    if not keys:
+        return {}
+    keys = bindparam('keys', list(keys), type_=ARRAY(String))
+    q = select([table.c.external_id, table.c.id]).where(table.c.external_id == any_(keys))
+    return dict(conn.execute(q).fetchall())
+
+
+def show_converter(artist_table, venue_table, conflicts=None):
+    # Shows name their artist and venue by external_id ("artist", "venue").
+    # conflicts(conn, rows), if given, returns the positions of converted rows
+    # to reject as double bookings.
+    def convert(batch, conn):
+        artists = key_map(conn, artist_table, {r.get('artist') for r in batch} - {None, ''})
+        venues = key_map(conn, venue_table, {r.get('venue') for r in batch} - {None, ''})
+        rows = []
+        sources = []
+        rejected = []
+        for row in batch:
+            artist_id = artists.get(row.get('artist'))
+            venue_id = venues.get(row.get('venue'))
+            if artist_id is None or venue_id is None:
+                rejected.append((row, 'unknown artist or venue'))
+                continue
+            try:
+                start_time = dateutil.parser.isoparse(row['start_time'])
+            except (KeyError, TypeError, ValueError):
+                rejected.append((row, 'bad start_time'))
+                continue
+            rows.append({
+                "external_id": as_text(row.get('external_id')),
+                "artist_id": artist_id,
+                "venue_id": venue_id,
+                "start_time": start_time
+            })
+            sources.append(row)
+        if conflicts is not None:
+            clashes = conflicts(conn, rows)
+            rejected.extend((sources[i], 'double booking') for i in sorted(clashes))
+            rows = [r for i, r in enumerate(rows) if i not in clashes]
+        return rows, rejected
+    return convert
+
+
+def copy_value(value):
+    # Python value -> its text in a COPY ... (FORMAT csv) row; None stays an
+    # empty unquoted field, which COPY reads as NULL.
+    if isinstance(value, list):
+        return '{%s}' % ','.join('"%s"' % v.replace('\\', '\\\\').replace('"', '\\"') for v in value)
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def copy_insert(conn, table, rows):
+    # COPY the batch into a temporary table, then move it into `table` with a
+    # single INSERT ... SELECT that skips external_ids already present. The
+    # partitioned Shows only has a unique key on (external_id, start_time), so
+    # a show sent again with a new start_time is caught by NOT EXISTS rather
+    # than by ON CONFLICT, and an external_id the batch holds twice by keeping
+    # only its first row. Rows without an external_id all go in.
+    columns = list(rows[0])
+    stage = Table('import_stage', MetaData(), Column('stage_row', Integer),
+                  *[Column(name, table.c[name].type) for name in columns],
+                  prefixes=['TEMPORARY'], postgresql_on_commit='DROP')
+    stage.create(conn)
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for i, row in enumerate(rows):
+        writer.writerow([i] + [copy_value(row[name]) for name in columns])
+    buf.seek(0)
+    cursor = conn.connection.cursor()
+    cursor.copy_expert('COPY import_stage (stage_row, %s) FROM STDIN WITH (FORMAT csv)' % ', '.join(columns), buf)
+    first = func.row_number().over(partition_by=stage.c.external_id, order_by=stage.c.stage_row)
+    staged = select([stage.c[name] for name in columns] + [first.label('first')]).alias('staged')
+    present = exists().where(table.c.external_id == staged.c.external_id)
+    new = select([staged.c[name] for name in columns]) \
+        .where(or_(staged.c.external_id.is_(None), staged.c.first == 1)).where(~present)
+    stmt = insert(table).from_select(columns, new).on_conflict_do_nothing()
+    inserted = conn.execute(stmt).rowcount
+    # dropped now rather than at commit, so a transaction can copy twice
+    stage.drop(conn)
+    return inserted
+
+
+class Checkpoint(object):
+    """Number of input rows of `path` already committed, kept next to it in
+    `<path>.checkpoint` so that a failed import resumes at the failed batch."""
+
+    def __init__(self, path):
+        self.path = path + '.checkpoint'
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)['rows']
+        except (IOError, ValueError, KeyError):
+            return 0
+
+    def save(self, rows):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({"rows": rows}, f)
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def import_file(engine, table, path, convert, batch_size=5000, restart=False, echo=print):
+    """Stream `path` into `table` in batches of `batch_size` rows.
+
+    Each batch is COPYed to a temporary table and inserted, minus the
+    external_ids already present, in its own transaction, so re-running a file
+    never duplicates rows. Rows that cannot be parsed or converted are appended
+to `<path>.rejected`.
+    Returns the number of rows inserted; raises if a batch fails, leaving the
+    checkpoint at the last committed batch.
+    """
+    checkpoint = Checkpoint(path)
+    if restart:
+        checkpoint.clear()
+    done = checkpoint.load()
+    if done:
+        echo('%s: resuming after row %d' % (path, done))
+    rows = islice(read_rows(path), done, None)
+    read = inserted = rejected = 0
+    started = time.time()
+    for batch in batches(rows, batch_size):
+        batch_started = time.time()
+        rows = [row for row in batch if not isinstance(row, BadLine)]
+        bad = [(row.line, row.reason) for row in batch if isinstance(row, BadLine)]
+        try:
+            with engine.begin() as conn:
+                values, unconverted = convert(rows, conn) if rows else ([], [])
+                if values:
+                    inserted += copy_insert(conn, table, values)
+        except Exception:
+            echo('%s: batch of rows %d-%d failed; fix it and run the import again to resume'
+                 % (path, done + 1, done + len(batch)))
+            raise
+        bad += unconverted
+        if bad:
+            rejected += len(bad)
+            with open(path + '.rejected', 'a') as f:
+                for row, reason in bad:
+                    f.write(json.dumps({"reason": reason, "row": row}, default=str) + '\n')
+        read += len(batch)
+        done += len(batch)
+        checkpoint.save(done)
+        echo('%s: %d rows read, %d inserted (%d rows/s)'
+             % (path, done, inserted, len(batch) / max(time.time() - batch_started, 1e-6)))
+    checkpoint.clear()
+    elapsed = time.time() - started
+    echo('%s: done, %d inserted, %d rejected in %.1fs (%d rows/s)'
+         % (path, inserted, rejected, elapsed, read / max(elapsed, 1e-6)))
+    return inserted
@@ -0,0 +1,240 @@
+import threading
+import time
+
+import numpy as np
+
+
+# How much each signal adds to a candidate's score (the best possible score
+# is their sum): shared genres (Jaccard similarity of the genre sets), same
+# city, same state, and recent shows (log-scaled against the busiest).
+GENRE_WEIGHT = 0.6
+CITY_WEIGHT = 0.2
+STATE_WEIGHT = 0.1
+RECENT_WEIGHT = 0.1
+
+
+class Codes(object):
+    """Integer codes for strings (cities, states), shared by the indexes of
+    both sides so that their codes can be compared."""
+
+    def __init__(self):
+        self._codes = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            with self._lock:
+                code = self._codes.setdefault(value, len(self._codes) + 1)
+        return code
+
+
+class MatchIndex(object):
+    """Feature matrices of every venue or artist, for ranking candidates.
+
+    Row i holds one entity: its genres as a one-hot vector over `vocabulary`,
+    city and state codes, its seeking flag and its number of recent shows.
+    score() rates a profile against all rows at once with a matrix-vector
+    product and array comparisons, so ranking 100k candidates costs a few
+    milliseconds. Writes update single rows in place (deleted rows are reused),
+    and the index reports itself stale after max_age seconds, so every worker
+    rebuilds it to pick up writes made by the others and to let old shows
+    drop out of the recent counts. One rebuild runs at a time; writes made
+    while it runs are replayed onto its result.
+    """
+
+    def __init__(self, vocabulary, codes, max_age=None):
+        self.vocabulary = list(vocabulary)
+        self.codes = codes
+        self.max_age = max_age
+        self.built_at = None
+        self._genre = {g: i for i, g in enumerate(self.vocabulary)}
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._journal = None
+        self._arrays(0)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _arrays(self, capacity):
+        self.ids = np.full(capacity, -1, dtype=np.int64)
+        self.genres = np.zeros((capacity, len(self.vocabulary)), dtype=np.float32)
+        self.sizes = np.zeros(capacity, dtype=np.float32)
+        self.city = np.zeros(capacity, dtype=np.int32)
+        self.state = np.zeros(capacity, dtype=np.int32)
+        self.seeking = np.zeros(capacity, dtype=bool)
+        self.recent = np.zeros(capacity, dtype=np.float32)
+        self._rows = {}
+        self._free = list(range(capacity - 1, -1, -1))
+
+    def stale(self, max_age=None):
+        # max_age, if given, overrides the one of the constructor
+        if self.built_at is None:
+            return True
+        max_age = self.max_age if max_age is None else max_age
+        return max_age is not None and time.time() - self.built_at > max_age
+
+    def one_hot(self, genres):
+        vector = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for genre in genres or ():
+            if genre in self._genre:
+                vector[self._genre[genre]] = 1
+        return vector
+
+    def rebuild(self, rows):
+        # rows yields (id, genres, city, state, seeking, recent shows); pass a
+        # query, it is only run by the call that rebuilds. While a rebuild
+        # runs, other calls return False at once and the current matrices
+        # keep serving, unless there are none yet: then they wait for it.
+        first = self.built_at is None
+        if not self._rebuild_lock.acquire(blocking=first):
+            return False
+        try:
+            if first and self.built_at is not None:
+                return False
+            with self._lock:
+                self._journal = []
+            fresh = self._build(list(rows))
+            with self._lock:
+                for name in ('ids', 'genres', 'sizes', 'city', 'state', 'seeking', 'recent', '_rows', '_free'):
+                    setattr(self, name, getattr(fresh, name))
+                # writes made since the rows were asked for; the rows may
+                # already hold some of them, so a show booked right then can
+                # count twice until the next rebuild
+                for name, args in self._journal:
+                    getattr(self, name)(*args)
+                self.built_at = time.time()
+            return True
+        finally:
+            with self._lock:
+                self._journal = None
+            self._rebuild_lock.release()
+
+    def _build(self, rows):
+        # the matrices of `rows` as a detached index, each filled in one go:
+        # the one-hot genres by fancy indexing with (row, genre) pairs
+        fresh = MatchIndex(self.vocabulary, self.codes)
+        fresh._arrays(len(rows))
+        fresh._free = []
+        if not rows:
+            return fresh
+        ids, genres, cities, states, seeking, recent = zip(*rows)
+        genres = [g or () for g in genres]
+        positions = np.fromiter((self._genre.get(g, -1) for entity in genres for g in entity), dtype=np.int64)
+        entities = np.repeat(np.arange(len(rows)), [len(entity) for entity in genres])
+        known = positions >= 0
+        fresh.genres[entities[known], positions[known]] = 1
+        fresh.sizes[:] = fresh.genres.sum(axis=1)
+        fresh.ids[:] = ids
+        fresh.city[:] = [self.codes(((city or '').lower(), state)) for city, state in zip(cities, states)]
+        fresh.state[:] = [self.codes(state) for state in states]
+        fresh.seeking[:] = [bool(s) for s in seeking]
+        fresh.recent[:] = recent
+        fresh._rows = dict(zip(ids, range(len(rows))))
+        return fresh
+
+    def _set(self, i, id, genres, city, state, seeking, recent):
+        self.ids[i] = id
+        self.genres[i] = self.one_hot(genres)
+        self.sizes[i] = self.genres[i].sum()
+        self.city[i] = self.codes(((city or '').lower(), state))
+        self.state[i] = self.codes(state)
+        self.seeking[i] = bool(seeking)
+        self.recent[i] = recent
+        self._rows[id] = i
+
+    def _record(self, name, *args):
+        # with _lock held: keep a write for the rebuild in progress, if any
+        if self._journal is not None:
+            self._journal.append((name, args))
+
+    def upsert(self, id, genres, city, state, seeking):
+        # an entity was created or edited; its recent show count is kept
+        with self._lock:
+            self._record('_upsert', id, genres, city, state, seeking)
+            self._upsert(id, genres, city, state, seeking)
+
+    def _upsert(self, id, genres, city, state, seeking):
+        i = self._rows.get(id)
+        recent = self.recent[i] if i is not None else 0
+        if i is None:
+            if not self._free:
+                self._grow()
+            i = self._free.pop()
+        self._set(i, id, genres, city, state, seeking, recent)
+
+    def _grow(self):
+        old = len(self.ids)
+        capacity = max(16, old * 2)
+        for name in ('ids', 'genres', 'sizes', 'city', 'state', 'seeking', 'recent'):
+            array = getattr(self, name)
+            grown = np.full((capacity,) + array.shape[1:], -1 if name == 'ids' else 0, dtype=array.dtype)
+            grown[:old] = array
+            setattr(self, name, grown)
+        self._free.extend(range(capacity - 1, old - 1, -1))
+
+    def remove(self, id):
+        with self._lock:
+            self._record('_remove', id)
+            self._remove(id)
+
+    def _remove(self, id):
+        i = self._rows.pop(id, None)
+        if i is not None:
+            self.ids[i] = -1
+            self.seeking[i] = False
+            self.recent[i] = 0
+            self._free.append(i)
+
+    def add_shows(self, counts):
+        # {id: new shows}, as shows are booked
+        with self._lock:
+            self._record('_add_shows', counts)
+            self._add_shows(counts)
+
+    def _add_shows(self, counts):
+        for id, n in counts.items():
+            i = self._rows.get(id)
+            if i is not None:
+                self.recent[i] += n
+
+    def profile(self, id):
+        # (genre vector, city code, state code) of one entity, to score the
+        # other side's index with; None when it is not indexed
+        with self._lock:
+            i = self._rows.get(id)
+            if i is None:
+                return None
+            return self.genres[i].copy(), int(self.city[i]), int(self.state[i])
+
+    def score(self, genres, city, state, limit=10, seeking_only=True):
+        """The `limit` best rows for a profile, best first, as dicts with the
+        id, the score and what matched."""
+        with self._lock:
+            shared = self.genres @ genres
+            union = self.sizes + genres.sum() - shared
+            similarity = np.divide(shared, union, out=np.zeros_like(shared), where=union > 0)
+            recent = np.log1p(self.recent)
+            busiest = recent.max() if len(recent) else 0
+            scores = (GENRE_WEIGHT * similarity
+                      + CITY_WEIGHT * (self.city == city)
+                      + STATE_WEIGHT * (self.state == state)
+                      + RECENT_WEIGHT * (recent / busiest if busiest > 0 else recent))
+            candidates = self.ids >= 0
+            if seeking_only:
+                candidates &= self.seeking
+            scores[~candidates] = -np.inf
+            k = min(limit, int(candidates.sum()))
+            if k <= 0:
+                return []
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind='stable')]
+            return [{
+                "id": int(self.ids[i]),
+                "score": round(float(scores[i]), 4),
+                "genres": [self.vocabulary[g] for g in np.flatnonzero(self.genres[i] * genres)],
+                "same_city": bool(self.city[i] == city),
+                "same_state": bool(self.state[i] == state),
+                "recent_shows": int(self.recent[i])
+            } for i in top]
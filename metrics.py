@@ -0,0 +1,70 @@
+import bisect
+import threading
+
+
+TIME_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (1000, 10000, 50000, 100000, 500000, 1000000, 5000000, 10000000)
+
+
+def label_value(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class Histogram(object):
+    """Prometheus histogram with one series per value of a single label."""
+
+    def __init__(self, name, help, buckets, label='endpoint'):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.label = label
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label, value):
+        with self._lock:
+            series = self._series.get(label)
+            if series is None:
+                # per-bucket counts (the last one is +Inf), sum, count
+                series = self._series[label] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def expose(self):
+        lines = ['# HELP %s %s' % (self.name, self.help), '# TYPE %s histogram' % self.name]
+        with self._lock:
+            series = sorted((label, [list(s[0]), s[1], s[2]]) for label, s in self._series.items())
+        for label, (counts, total, count) in series:
+            name = '%s="%s"' % (self.label, label_value(label))
+            seen = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                seen += n
+                lines.append('%s_bucket{%s,le="%s"} %d' % (self.name, name, number(bound), seen))
+            lines.append('%s_sum{%s} %s' % (self.name, name, number(total)))
+            lines.append('%s_count{%s} %d' % (self.name, name, count))
+        return '\n'.join(lines)
+
+
+class Registry(object):
+    """The histograms of one worker process, rendered in the Prometheus text
+    format. Each worker keeps its own numbers, so scrape every worker (or run
+    a single one) to see them all."""
+
+    def __init__(self):
+        self.histograms = []
+
+    def histogram(self, name, help, buckets, label='endpoint'):
+        histogram = Histogram(name, help, buckets, label)
+        self.histograms.append(histogram)
+        return histogram
+
+    def expose(self):
+        return '\n'.join(h.expose() for h in self.histograms) + '\n'
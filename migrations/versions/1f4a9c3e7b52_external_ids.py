@@ -0,0 +1,28 @@
+"""external_id on Venue, Artist and Shows for bulk imports
+
+Revision ID: 1f4a9c3e7b52
+Revises: d8b2c4f61e3a
+Create Date: 2026-10-18 08:21:03.117845
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1f4a9c3e7b52'
+down_revision = 'd8b2c4f61e3a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('Venue', 'Artist', 'Shows'):
+        op.add_column(table, sa.Column('external_id', sa.String(), nullable=True))
+        op.create_unique_constraint('%s_external_id_key' % table, table, ['external_id'])
+
+
+def downgrade():
+    for table in ('Venue', 'Artist', 'Shows'):
+        op.drop_constraint('%s_external_id_key' % table, table, type_='unique')
+        op.drop_column(table, 'external_id')
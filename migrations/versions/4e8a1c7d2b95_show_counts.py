@@ -0,0 +1,72 @@
+"""upcoming/past show counters on venues and artists
+
+Revision ID: 4e8a1c7d2b95
+Revises: 7c2d9e4b1a63
+Create Date: 2026-10-18 11:20:37.104582
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4e8a1c7d2b95'
+down_revision = '7c2d9e4b1a63'
+branch_labels = None
+depends_on = None
+
+DELTA = ('UPDATE "{table}" t SET upcoming_shows_count = upcoming_shows_count {sign} d.upcoming, '
+         'past_shows_count = past_shows_count {sign} d.past '
+         'FROM (SELECT {fk} AS id, count(*) FILTER (WHERE start_time > rolled) AS upcoming, '
+         'count(*) FILTER (WHERE start_time <= rolled) AS past FROM {rows} GROUP BY {fk}) d '
+         'WHERE t.id = d.id;')
+
+
+def deltas(sign, rows):
+    return ' '.join(DELTA.format(table=table, fk=fk, sign=sign, rows=rows)
+                    for table, fk in (('Venue', 'venue_id'), ('Artist', 'artist_id')))
+
+
+def upgrade():
+    for table in ('Venue', 'Artist'):
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+    op.create_table('show_clock',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('rolled_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("INSERT INTO show_clock (id, rolled_at) VALUES (1, now())")
+    for table, fk in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        op.execute('UPDATE "{table}" t SET upcoming_shows_count = d.upcoming, past_shows_count = d.past '
+                   'FROM (SELECT {fk} AS id, count(*) FILTER (WHERE start_time > c.rolled_at) AS upcoming, '
+                   'count(*) FILTER (WHERE start_time <= c.rolled_at) AS past '
+                   'FROM "Shows", show_clock c GROUP BY {fk}) d '
+                   'WHERE t.id = d.id'.format(table=table, fk=fk))
+    op.execute("CREATE OR REPLACE FUNCTION fyyur_count_shows() RETURNS trigger LANGUAGE plpgsql AS $$ "
+               "DECLARE rolled timestamptz; "
+               "BEGIN "
+               "SELECT rolled_at INTO rolled FROM show_clock WHERE id = 1 FOR SHARE; "
+               "IF TG_OP IN ('DELETE', 'UPDATE') THEN " + deltas('-', 'old_rows') + " END IF; "
+               "IF TG_OP IN ('INSERT', 'UPDATE') THEN " + deltas('+', 'new_rows') + " END IF; "
+               "RETURN NULL; "
+               "END $$")
+    op.execute('CREATE TRIGGER "Shows_count_insert" AFTER INSERT ON "Shows" '
+               'REFERENCING NEW TABLE AS new_rows '
+               'FOR EACH STATEMENT EXECUTE FUNCTION fyyur_count_shows()')
+    op.execute('CREATE TRIGGER "Shows_count_update" AFTER UPDATE ON "Shows" '
+               'REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows '
+               'FOR EACH STATEMENT EXECUTE FUNCTION fyyur_count_shows()')
+    op.execute('CREATE TRIGGER "Shows_count_delete" AFTER DELETE ON "Shows" '
+               'REFERENCING OLD TABLE AS old_rows '
+               'FOR EACH STATEMENT EXECUTE FUNCTION fyyur_count_shows()')
+
+
+def downgrade():
+    for name in ('insert', 'update', 'delete'):
+        op.execute('DROP TRIGGER "Shows_count_%s" ON "Shows"' % name)
+    op.execute("DROP FUNCTION fyyur_count_shows()")
+    op.drop_table('show_clock')
+    for table in ('Venue', 'Artist'):
+        op.drop_column(table, 'past_shows_count')
+        op.drop_column(table, 'upcoming_shows_count')
@@ -0,0 +1,26 @@
+"""index shows by (start_time, id) for the feed
+
+Revision ID: 5b2e8f1c3a70
+Revises: 0396b24100b1
+Create Date: 2026-10-18 06:28:51.530964
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b2e8f1c3a70'
+down_revision = '0396b24100b1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # IF NOT EXISTS: databases built from an earlier copy of the first
+    # revision have it already
+    op.execute('CREATE INDEX IF NOT EXISTS "ix_Shows_start_time_id" ON "Shows" (start_time, id)')
+
+
+def downgrade():
+    op.drop_index('ix_Shows_start_time_id', table_name='Shows')
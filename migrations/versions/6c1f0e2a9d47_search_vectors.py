@@ -0,0 +1,38 @@
+"""indexed full-text search on venues and artists
+
+Revision ID: 6c1f0e2a9d47
+Revises: 5b2e8f1c3a70
+Create Date: 2026-10-18 06:40:12.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '6c1f0e2a9d47'
+down_revision = '5b2e8f1c3a70'
+branch_labels = None
+depends_on = None
+
+SEARCH_VECTOR = ("setweight(to_tsvector('simple', name), 'A') || "
+                 "setweight(to_tsvector('simple', city || ' ' || state), 'B') || "
+                 "setweight(to_tsvector('simple', fyyur_array_text(genres)), 'C')")
+
+
+def upgrade():
+    op.execute("CREATE OR REPLACE FUNCTION fyyur_array_text(text[]) RETURNS text "
+               "LANGUAGE sql IMMUTABLE AS $$ SELECT array_to_string($1, ' ') $$")
+    for table in ('Venue', 'Artist'):
+        op.add_column(table, sa.Column('search_vector', postgresql.TSVECTOR(),
+                                       sa.Computed(SEARCH_VECTOR, persisted=True)))
+        op.create_index('ix_%s_search_vector' % table, table, ['search_vector'],
+                        unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    for table in ('Venue', 'Artist'):
+        op.drop_index('ix_%s_search_vector' % table, table_name=table)
+        op.drop_column(table, 'search_vector')
+    op.execute("DROP FUNCTION fyyur_array_text(text[])")
@@ -0,0 +1,26 @@
+"""(name, id) indexes for the show form pickers
+
+Revision ID: 7c2d9e4b1a63
+Revises: 1f4a9c3e7b52
+Create Date: 2026-10-18 09:02:44.530218
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c2d9e4b1a63'
+down_revision = '1f4a9c3e7b52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_Artist_name_id', 'Artist', ['name', 'id'], unique=False)
+    op.create_index('ix_Venue_name_id', 'Venue', ['name', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Venue_name_id', table_name='Venue')
+    op.drop_index('ix_Artist_name_id', table_name='Artist')
@@ -0,0 +1,60 @@
+"""move Shows to direct artist/venue foreign keys
+
+Revision ID: a3e5b7d21c08
+Revises: 6c1f0e2a9d47
+Create Date: 2026-10-18 07:05:41.902117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3e5b7d21c08'
+down_revision = '6c1f0e2a9d47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Shows', sa.Column('artist_id', sa.Integer(), nullable=True))
+    op.add_column('Shows', sa.Column('venue_id', sa.Integer(), nullable=True))
+    # Backfill both columns in one pass. A show linked to several artists or
+    # venues keeps one of them; the views only ever showed the first.
+    op.execute('UPDATE "Shows" s SET artist_id = a.artist_id, venue_id = v.venue_id '
+               'FROM sh_art a, sh_ven v WHERE a.shows_id = s.id AND v.shows_id = s.id')
+    op.drop_table('sh_ven')
+    op.drop_table('sh_art')
+    # shows missing either side could not be displayed by any page
+    op.execute('DELETE FROM "Shows" WHERE artist_id IS NULL OR venue_id IS NULL')
+    op.alter_column('Shows', 'artist_id', nullable=False)
+    op.alter_column('Shows', 'venue_id', nullable=False)
+    op.create_foreign_key('Shows_artist_id_fkey', 'Shows', 'Artist', ['artist_id'], ['id'])
+    op.create_foreign_key('Shows_venue_id_fkey', 'Shows', 'Venue', ['venue_id'], ['id'])
+    op.create_index('ix_Shows_artist_id_start_time', 'Shows', ['artist_id', 'start_time'], unique=False)
+    op.create_index('ix_Shows_venue_id_start_time', 'Shows', ['venue_id', 'start_time'], unique=False)
+
+
+def downgrade():
+    op.create_table('sh_art',
+    sa.Column('shows_id', sa.Integer(), nullable=False),
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ),
+    sa.ForeignKeyConstraint(['shows_id'], ['Shows.id'], ),
+    sa.PrimaryKeyConstraint('shows_id', 'artist_id')
+    )
+    op.create_table('sh_ven',
+    sa.Column('shows_id', sa.Integer(), nullable=False),
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['shows_id'], ['Shows.id'], ),
+    sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ),
+    sa.PrimaryKeyConstraint('shows_id', 'venue_id')
+    )
+    op.execute('INSERT INTO sh_art (shows_id, artist_id) SELECT id, artist_id FROM "Shows"')
+    op.execute('INSERT INTO sh_ven (shows_id, venue_id) SELECT id, venue_id FROM "Shows"')
+    op.drop_index('ix_Shows_venue_id_start_time', table_name='Shows')
+    op.drop_index('ix_Shows_artist_id_start_time', table_name='Shows')
+    op.drop_constraint('Shows_venue_id_fkey', 'Shows', type_='foreignkey')
+    op.drop_constraint('Shows_artist_id_fkey', 'Shows', type_='foreignkey')
+    op.drop_column('Shows', 'venue_id')
+    op.drop_column('Shows', 'artist_id')
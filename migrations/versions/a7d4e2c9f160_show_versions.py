@@ -0,0 +1,53 @@
+"""versions of the show feed and of each venue's and artist's shows
+
+Revision ID: a7d4e2c9f160
+Revises: c3f8e1a6d729
+Create Date: 2026-10-18 17:41:09.218733
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d4e2c9f160'
+down_revision = 'c3f8e1a6d729'
+branch_labels = None
+depends_on = None
+
+DELTA = ('UPDATE "{table}" t SET upcoming_shows_count = upcoming_shows_count {sign} d.upcoming, '
+         'past_shows_count = past_shows_count {sign} d.past{touch} '
+         'FROM (SELECT {fk} AS id, count(*) FILTER (WHERE start_time > rolled) AS upcoming, '
+         'count(*) FILTER (WHERE start_time <= rolled) AS past FROM {rows} GROUP BY {fk}) d '
+         'WHERE t.id = d.id;')
+
+CLOCK = {
+    True: 'UPDATE show_clock SET shows_changed_at = clock_timestamp() WHERE id = 1 RETURNING rolled_at INTO rolled; ',
+    False: 'SELECT rolled_at INTO rolled FROM show_clock WHERE id = 1 FOR SHARE; '
+}
+
+
+def count_shows(touch):
+    def deltas(sign, rows):
+        return ' '.join(DELTA.format(table=table, fk=fk, sign=sign, rows=rows,
+                                     touch=', shows_changed_at = clock_timestamp()' if touch else '')
+                        for table, fk in (('Venue', 'venue_id'), ('Artist', 'artist_id')))
+    op.execute("CREATE OR REPLACE FUNCTION fyyur_count_shows() RETURNS trigger LANGUAGE plpgsql AS $$ "
+               "DECLARE rolled timestamptz; "
+               "BEGIN " + CLOCK[touch] +
+               "IF TG_OP IN ('DELETE', 'UPDATE') THEN " + deltas('-', 'old_rows') + " END IF; "
+               "IF TG_OP IN ('INSERT', 'UPDATE') THEN " + deltas('+', 'new_rows') + " END IF; "
+               "RETURN NULL; "
+               "END $$")
+
+
+def upgrade():
+    for table in ('Venue', 'Artist', 'show_clock'):
+        op.add_column(table, sa.Column('shows_changed_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False))
+    count_shows(touch=True)
+
+
+def downgrade():
+    count_shows(touch=False)
+    for table in ('show_clock', 'Artist', 'Venue'):
+        op.drop_column(table, 'shows_changed_at')
@@ -0,0 +1,30 @@
+"""delete shows together with their venue or artist
+
+Revision ID: b9d3f5a0e217
+Revises: 4e8a1c7d2b95
+Create Date: 2026-10-18 12:04:19.662930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b9d3f5a0e217'
+down_revision = '4e8a1c7d2b95'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_constraint('Shows_artist_id_fkey', 'Shows', type_='foreignkey')
+    op.drop_constraint('Shows_venue_id_fkey', 'Shows', type_='foreignkey')
+    op.create_foreign_key('Shows_artist_id_fkey', 'Shows', 'Artist', ['artist_id'], ['id'], ondelete='CASCADE')
+    op.create_foreign_key('Shows_venue_id_fkey', 'Shows', 'Venue', ['venue_id'], ['id'], ondelete='CASCADE')
+
+
+def downgrade():
+    op.drop_constraint('Shows_venue_id_fkey', 'Shows', type_='foreignkey')
+    op.drop_constraint('Shows_artist_id_fkey', 'Shows', type_='foreignkey')
+    op.create_foreign_key('Shows_venue_id_fkey', 'Shows', 'Venue', ['venue_id'], ['id'])
+    op.create_foreign_key('Shows_artist_id_fkey', 'Shows', 'Artist', ['artist_id'], ['id'])
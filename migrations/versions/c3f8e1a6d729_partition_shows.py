@@ -0,0 +1,90 @@
+"""partition shows by start_time year
+
+Revision ID: c3f8e1a6d729
+Revises: f2a4c6e8b013
+Create Date: 2026-10-18 15:02:44.630118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f8e1a6d729'
+down_revision = 'f2a4c6e8b013'
+branch_labels = None
+depends_on = None
+
+# years after the current one that get a partition up front; later shows go
+# to "Shows_default" until `flask show-partitions` creates theirs
+AHEAD = 2
+
+COLUMNS = 'id, external_id, artist_id, venue_id, start_time, updated_at, series_id'
+INDEXES = (('ix_Shows_artist_id_start_time', ['artist_id', 'start_time']),
+           ('ix_Shows_series_id', ['series_id']),
+           ('ix_Shows_start_time_id', ['start_time', 'id']),
+           ('ix_Shows_venue_id_start_time', ['venue_id', 'start_time']))
+TRIGGERS = (('insert', 'INSERT', 'NEW TABLE AS new_rows'),
+            ('update', 'UPDATE', 'OLD TABLE AS old_rows NEW TABLE AS new_rows'),
+            ('delete', 'DELETE', 'OLD TABLE AS old_rows'))
+
+
+def replace_shows(partitioned):
+    # Shows is rebuilt under the same name and refilled from the old table:
+    # Postgres cannot turn a table into a partitioned one in place. The count
+    # triggers are only added back once the rows are in, so the counters
+    # stay as they are.
+    for name, event, tables in TRIGGERS:
+        op.execute('DROP TRIGGER "Shows_count_%s" ON "Shows"' % name)
+    for name, columns in INDEXES:
+        op.drop_index(name, table_name='Shows')
+    op.rename_table('Shows', 'Shows_old')
+    op.execute('ALTER TABLE "Shows_old" DROP CONSTRAINT "Shows_pkey"')
+    op.execute('ALTER INDEX "%s" RENAME TO "Shows_old_external_id_key"'
+               % ('Shows_external_id_key' if partitioned else 'Shows_external_id_start_time_key'))
+    if partitioned:
+        keys = [sa.PrimaryKeyConstraint('id', 'start_time'),
+                sa.UniqueConstraint('external_id', 'start_time')]
+        options = {'postgresql_partition_by': 'RANGE (start_time)'}
+    else:
+        keys = [sa.PrimaryKeyConstraint('id'), sa.UniqueConstraint('external_id')]
+        options = {}
+    op.create_table('Shows',
+    sa.Column('id', sa.Integer(), server_default=sa.text('nextval(\'"Shows_id_seq"\'::regclass)'), nullable=False),
+    sa.Column('external_id', sa.String(), nullable=True),
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('start_time', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('series_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['series_id'], ['ShowSeries.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ondelete='CASCADE'),
+    *keys, **options
+    )
+    if partitioned:
+        bind = op.get_bind()
+        first, this = bind.execute(sa.text(
+            "SELECT extract(year FROM min(start_time) AT TIME ZONE 'UTC')::int, "
+            "extract(year FROM now() AT TIME ZONE 'UTC')::int FROM \"Shows_old\"")).first()
+        for year in range(min(first or this, this), this + AHEAD + 1):
+            op.execute('CREATE TABLE "Shows_%d" PARTITION OF "Shows" '
+                       "FOR VALUES FROM ('%d-01-01 00:00+00') TO ('%d-01-01 00:00+00')" % (year, year, year + 1))
+        op.execute('CREATE TABLE "Shows_default" PARTITION OF "Shows" DEFAULT')
+    op.execute('INSERT INTO "Shows" (%s) SELECT %s FROM "Shows_old"' % (COLUMNS, COLUMNS))
+    op.execute('ALTER SEQUENCE "Shows_id_seq" OWNED BY "Shows".id')
+    op.drop_table('Shows_old')
+    for name, columns in INDEXES:
+        op.create_index(name, 'Shows', columns, unique=False)
+    for name, event, tables in TRIGGERS:
+        op.execute('CREATE TRIGGER "Shows_count_%s" AFTER %s ON "Shows" REFERENCING %s '
+                   'FOR EACH STATEMENT EXECUTE FUNCTION fyyur_count_shows()' % (name, event, tables))
+
+
+def upgrade():
+    replace_shows(partitioned=True)
+
+
+def downgrade():
+    # shows in archived partitions (schema "archive") stay where they are
+    replace_shows(partitioned=False)
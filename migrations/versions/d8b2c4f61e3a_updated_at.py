@@ -0,0 +1,27 @@
+"""updated_at on Venue, Artist and Shows
+
+Revision ID: d8b2c4f61e3a
+Revises: a3e5b7d21c08
+Create Date: 2026-10-18 07:48:26.550713
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8b2c4f61e3a'
+down_revision = 'a3e5b7d21c08'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('Venue', 'Artist', 'Shows'):
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(timezone=True),
+                                       server_default=sa.text('now()'), nullable=False))
+
+
+def downgrade():
+    for table in ('Venue', 'Artist', 'Shows'):
+        op.drop_column(table, 'updated_at')
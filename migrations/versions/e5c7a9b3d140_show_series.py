@@ -0,0 +1,39 @@
+"""recurring show series
+
+Revision ID: e5c7a9b3d140
+Revises: b9d3f5a0e217
+Create Date: 2026-10-18 13:11:52.407316
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5c7a9b3d140'
+down_revision = 'b9d3f5a0e217'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ShowSeries',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('start_time', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('rule', sa.String(), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.add_column('Shows', sa.Column('series_id', sa.Integer(), nullable=True))
+    op.create_index(op.f('ix_Shows_series_id'), 'Shows', ['series_id'], unique=False)
+    op.create_foreign_key('Shows_series_id_fkey', 'Shows', 'ShowSeries', ['series_id'], ['id'], ondelete='CASCADE')
+
+
+def downgrade():
+    op.drop_constraint('Shows_series_id_fkey', 'Shows', type_='foreignkey')
+    op.drop_index(op.f('ix_Shows_series_id'), table_name='Shows')
+    op.drop_column('Shows', 'series_id')
+    op.drop_table('ShowSeries')
@@ -0,0 +1,26 @@
+"""GIN indexes on venue and artist genres
+
+Revision ID: f2a4c6e8b013
+Revises: e5c7a9b3d140
+Create Date: 2026-10-18 14:26:08.915274
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2a4c6e8b013'
+down_revision = 'e5c7a9b3d140'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_Artist_genres', 'Artist', ['genres'], unique=False, postgresql_using='gin')
+    op.create_index('ix_Venue_genres', 'Venue', ['genres'], unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_Venue_genres', table_name='Venue')
+    op.drop_index('ix_Artist_genres', table_name='Artist')
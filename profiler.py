@@ -0,0 +1,97 @@
+import cProfile
+import glob
+import os
+import pstats
+import random
+import time
+
+from flask import current_app
+from itsdangerous import BadSignature, TimestampSigner
+
+
+class Profiler(object):
+    """Runs chosen requests under cProfile and dumps the stats to PROFILE_DIR.
+
+    A request is profiled when it carries an `X-Profile` header holding a
+    token from token() (signed with SECRET_KEY, valid PROFILE_TOKEN_MAX_AGE
+    seconds), or at random with probability PROFILE_SAMPLE_RATE. It wraps the
+    WSGI app of each app it is initialized with, so the profile covers the
+    view, the template rendering and the request hooks. Every other request costs a header lookup.
+    """
+
+    header = 'HTTP_X_PROFILE'
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # Every app gets its own wrapper around its own wsgi_app; nothing
+        # about an app is kept on the extension, and wrapping twice is a no-op.
+        if 'profiler' in app.extensions:
+            return
+        app.extensions['profiler'] = self
+        wsgi_app = app.wsgi_app
+
+        def profiled(environ, start_response):
+            return self.run(app, wsgi_app, environ, start_response)
+        app.wsgi_app = profiled
+
+    def signer(self, app=None):
+        app = app or current_app
+        return TimestampSigner(app.config['SECRET_KEY'], salt='fyyur-profile')
+
+    def token(self, app=None):
+        return self.signer(app).sign('profile').decode()
+
+    def wanted(self, app, environ):
+        token = environ.get(self.header)
+        if token:
+            try:
+                self.signer(app).unsign(token, max_age=app.config.get('PROFILE_TOKEN_MAX_AGE', 3600))
+                return True
+            except BadSignature:
+                return False
+        rate = app.config.get('PROFILE_SAMPLE_RATE', 0)
+        return rate > 0 and random.random() < rate
+
+    def run(self, app, wsgi_app, environ, start_response):
+        if not self.wanted(app, environ):
+            return wsgi_app(environ, start_response)
+        profile = cProfile.Profile()
+        body = []
+        started = time.time()
+        profile.enable()
+        try:
+            # consume the body in here, so that streamed templates are
+            # rendered under the profiler too
+            app_iter = wsgi_app(environ, start_response)
+            try:
+                body.extend(app_iter)
+            finally:
+                if hasattr(app_iter, 'close'):
+                    app_iter.close()
+        finally:
+            profile.disable()
+        elapsed = time.time() - started
+        directory = app.config.get('PROFILE_DIR', 'profiles')
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, '%s.%s.%.0fms.%d.prof' % (
+            environ['REQUEST_METHOD'],
+            environ.get('PATH_INFO', '').strip('/').replace('/', '.') or 'root',
+            elapsed * 1000, started * 1000))
+        profile.dump_stats(path)
+        app.logger.info('profiled %s %s in %.0fms: %s', environ['REQUEST_METHOD'],
+                        environ.get('PATH_INFO'), elapsed * 1000, path)
+        return body
+
+
+def report(directory, pattern='*', sort='cumulative', limit=30, stream=None):
+    # Merge every profile in `directory` matching `pattern` (e.g. "GET.venues.*")
+    # and print the hottest functions. Returns the number of profiles merged.
+    paths = sorted(glob.glob(os.path.join(directory, pattern + '.prof')))
+    if not paths:
+        return 0
+    stats = pstats.Stats(*paths, stream=stream)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return len(paths)
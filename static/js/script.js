@@ -1,4 +1,86 @@
 window.parseISOString = function parseISOString(s) {
     var b = s.split(/\D+/);
     return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
-};
\ No newline at end of file
+};
+
+// Name completions for the navbar search boxes, fetched as the user types.
+(function () {
+    var inputs = document.querySelectorAll('input[data-suggest]');
+    var list = document.getElementById('search-suggestions');
+    Array.prototype.forEach.call(inputs, function (input) {
+        var timer = null;
+        input.addEventListener('input', function () {
+            clearTimeout(timer);
+            timer = setTimeout(function () {
+                if (!input.value.trim()) {
+                    return;
+                }
+                fetch('/api/search/suggest?limit=8&q=' + encodeURIComponent(input.value))
+                    .then(function (response) { return response.json(); })
+                    .then(function (data) {
+                        list.innerHTML = '';
+                        data[input.dataset.suggest].forEach(function (item) {
+                            var option = document.createElement('option');
+                            option.value = item.name;
+                            list.appendChild(option);
+                        });
+                    });
+            }, 150);
+        });
+    });
+})();
+
+// Artist and venue pickers of the new show form: the options are looked up
+// page by page as the user types, and picking one fills the hidden id field.
+(function () {
+    var pickers = document.querySelectorAll('.picker[data-lookup]');
+    Array.prototype.forEach.call(pickers, function (picker) {
+        var search = picker.querySelector('.picker-search');
+        var value = picker.querySelector('.picker-value');
+        var results = picker.querySelector('.picker-results');
+        var more = picker.querySelector('.picker-more');
+        var timer = null;
+        var next = null;
+
+        function load(append) {
+            var url = '/api/lookup/' + picker.dataset.lookup + '?limit=10&q=' + encodeURIComponent(search.value);
+            if (append && next) {
+                url += '&after=' + encodeURIComponent(next);
+            }
+            fetch(url)
+                .then(function (response) { return response.json(); })
+                .then(function (data) {
+                    if (!append) {
+                        results.innerHTML = '';
+                    }
+                    data.results.forEach(function (item) {
+                        var option = document.createElement('li');
+                        option.className = 'list-group-item';
+                        option.textContent = item.name + ' (' + item.city + ', ' + item.state + ')';
+                        option.addEventListener('click', function () {
+                            value.value = item.id;
+                            search.value = item.name;
+                            results.innerHTML = '';
+                            more.hidden = true;
+                        });
+                        results.appendChild(option);
+                    });
+                    next = data.next;
+                    more.hidden = !next;
+                });
+        }
+
+        search.addEventListener('input', function () {
+            value.value = '';
+            clearTimeout(timer);
+            timer = setTimeout(function () { load(false); }, 150);
+        });
+        more.addEventListener('click', function () { load(true); });
+        search.form.addEventListener('submit', function (event) {
+            if (!value.value) {
+                event.preventDefault();
+                search.focus();
+            }
+        });
+    });
+})();
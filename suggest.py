@@ -0,0 +1,103 @@
+import bisect
+import re
+import threading
+import time
+
+
+def name_keys(name):
+    # "The Musical Hop" -> "the musical hop", "musical hop", "hop", so a
+    # completion can start at any word of the name.
+    words = re.findall(r'\w+', name.lower())
+    return [' '.join(words[i:]) for i in range(len(words))]
+
+
+class PrefixIndex(object):
+    """In-process name completion index for one kind of entity.
+
+    Keys are kept in a sorted list of (key, id) tuples and looked up with
+    bisect, which is far more compact than a trie. The index holds at most
+    max_entries keys: an entity whose keys do not fit is left out whole, name
+    included, so names beyond the cap are not suggested. It reports itself
+    stale after max_age seconds so that every worker picks up writes made by
+    the others.
+    Both limits can be passed per call instead, e.g. from the app's config.
+    """
+
+    def __init__(self, max_entries=100000, max_age=None):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.built_at = None
+        self._keys = []
+        self._names = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def stale(self, max_age=None):
+        if self.built_at is None:
+            return True
+        max_age = self.max_age if max_age is None else max_age
+        return max_age is not None and time.time() - self.built_at > max_age
+
+    def rebuild(self, rows, max_entries=None):
+        # rows yields (id, name); the new index is swapped in at the end so
+        # lookups keep being served from the old one meanwhile. Reading stops
+        # at the first entity that does not fit.
+        max_entries = max_entries or self.max_entries
+        keys = []
+        names = {}
+        for id, name in rows:
+            entity_keys = name_keys(name)
+            if len(keys) + len(entity_keys) > max_entries:
+                break
+            keys.extend((key, id) for key in entity_keys)
+            names[id] = name
+        keys.sort()
+        with self._lock:
+            self._keys = keys
+            self._names = names
+            self.built_at = time.time()
+
+    def add(self, id, name, max_entries=None):
+        max_entries = max_entries or self.max_entries
+        with self._lock:
+            self._discard(id)
+            entity_keys = name_keys(name)
+            if len(self._keys) + len(entity_keys) > max_entries:
+                return
+            for key in entity_keys:
+                bisect.insort(self._keys, (key, id))
+            self._names[id] = name
+
+    def remove(self, id):
+        with self._lock:
+            self._discard(id)
+
+    def _discard(self, id):
+        name = self._names.pop(id, None)
+        if name is None:
+            return
+        for key in name_keys(name):
+            i = bisect.bisect_left(self._keys, (key, id))
+            if i < len(self._keys) and self._keys[i] == (key, id):
+                del self._keys[i]
+
+    def lookup(self, prefix, limit=10):
+        prefix = ' '.join(re.findall(r'\w+', prefix.lower()))
+        if not prefix:
+            return []
+        found = []
+        seen = set()
+        with self._lock:
+            i = bisect.bisect_left(self._keys, (prefix,))
+            while i < len(self._keys) and len(found) < limit:
+                key, id = self._keys[i]
+                if not key.startswith(prefix):
+                    break
+                if id not in seen:
+                    seen.add(id)
+                    found.append({"id": id, "name": self._names[id]})
+                i += 1
+        found.sort(key=lambda f: f["name"].lower())
+        return found
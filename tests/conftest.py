@@ -0,0 +1,47 @@
+import os
+
+import pytest
+
+# The app tests run against the database in DATABASE_URL (a migrated scratch
+# database); they remove the rows they create.
+DATABASE_URL = os.environ.get('DATABASE_URL')
+needs_db = pytest.mark.skipif(not DATABASE_URL, reason='DATABASE_URL is not set')
+
+
+@pytest.fixture
+def app():
+    from app import create_app
+    app = create_app({"SQLALCHEMY_DATABASE_URI": DATABASE_URL, "SECRET_KEY": 'test', "TESTING": True})
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def scratch(model, **values):
+    # a row for one test, deleted afterwards along with its shows
+    from app import db
+    row = model(**dict({"city": 'Testville', "state": 'CA', "genres": ['Jazz']}, **values))
+    db.session.add(row)
+    db.session.commit()
+    row_id = row.id
+    yield row_id
+    db.session.rollback()
+    model.query.filter_by(id=row_id).delete()
+    db.session.commit()
+
+
+@pytest.fixture
+def venue_id(app):
+    from app import Venue
+    yield from scratch(Venue, name='Test Venue Qz', external_id='test-venue-qz', address='1 Test Street',
+                       seeking_talent=False)
+
+
+@pytest.fixture
+def artist_id(app):
+    from app import Artist
+    yield from scratch(Artist, name='Test Artist Qz', external_id='test-artist-qz', seeking_venue=False)
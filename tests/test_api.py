@@ -0,0 +1,41 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import Shows, db
+from conftest import needs_db
+
+pytestmark = needs_db
+
+START = datetime(2031, 9, 1, 20, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def show_ids(venue_id, artist_id):
+    # two of them start at the same time, so the cursor needs the id too
+    times = [START, START + timedelta(days=1), START + timedelta(days=1), START + timedelta(days=2),
+             START + timedelta(days=3)]
+    ids = [db.session.execute(Shows.__table__.insert().returning(Shows.id),
+                              {"venue_id": venue_id, "artist_id": artist_id, "start_time": t}).scalar()
+           for t in times]
+    db.session.commit()
+    return ids
+
+
+def test_show_pages_follow_the_cursor_to_the_end(client, venue_id, show_ids):
+    seen = []
+    query = {"venue_id": venue_id, "limit": 2, "fields": 'id'}
+    page = client.get('/api/v1/shows', query_string=query).get_json()
+    while True:
+        assert len(page["data"]) <= 2
+        seen += [show["id"] for show in page["data"]]
+        if page["next"] is None:
+            break
+        page = client.get('/api/v1/shows', query_string=dict(query, after=page["next"])).get_json()
+    assert seen == show_ids
+
+
+def test_unknown_fields_and_bad_cursors_are_refused(client, venue_id):
+    assert client.get('/api/v1/shows?fields=id,secret').status_code == 400
+    assert client.get('/api/v1/venues?after=abc').status_code == 400
+    assert client.get('/api/v1/venues/%d?fields=name' % venue_id).get_json() == {"name": 'Test Venue Qz'}
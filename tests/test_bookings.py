@@ -0,0 +1,30 @@
+from datetime import datetime, timedelta, timezone
+
+from app import Shows
+from conftest import needs_db
+
+pytestmark = needs_db
+
+START = datetime(2031, 3, 1, 20, 0, tzinfo=timezone.utc)
+
+
+def book(client, venue_id, artist_id, start_time):
+    return client.post('/shows/create', data={"venue_id": venue_id, "artist_id": artist_id,
+                                              "start_time": start_time.isoformat()})
+
+
+def test_a_show_inside_another_ones_slot_is_refused(app, client, venue_id, artist_id):
+    slot = timedelta(minutes=app.config['SHOW_SLOT_MINUTES'])
+    book(client, venue_id, artist_id, START)
+    refused = book(client, venue_id, artist_id, START + slot / 2)
+    assert b'already booked' in refused.data
+    book(client, venue_id, artist_id, START + slot)
+    booked = Shows.query.filter_by(venue_id=venue_id).order_by(Shows.start_time)
+    assert [s.start_time for s in booked] == [START, START + slot]
+
+
+def test_bulk_api_refuses_shows_that_clash_with_each_other(client, venue_id, artist_id):
+    shows = [{"venue": 'test-venue-qz', "artist": 'test-artist-qz', "start_time": t.isoformat()}
+             for t in (START, START + timedelta(minutes=30))]
+    result = client.post('/api/v1/shows', json={"shows": shows}).get_json()
+    assert result == {"inserted": 1, "rejected": [{"index": 1, "error": 'double booking'}]}
@@ -0,0 +1,47 @@
+from cache import MemoryBackend
+from conftest import needs_db
+
+
+def test_memory_backend_evicts_the_least_recently_used_page():
+    backend = MemoryBackend(max_entries=2, ttl=60)
+    backend.set('a', b'A')
+    backend.set('b', b'B')
+    backend.get('a')
+    backend.set('c', b'C')
+    assert backend.get('b') is None
+    assert backend.get('a') == b'A'
+    assert backend.stats()["evictions"] == 1
+
+
+def test_memory_backend_bumps_only_the_given_tags():
+    backend = MemoryBackend()
+    backend.bump(['venue:1'])
+    assert backend.versions(['venue:1', 'venue:2']) == [1, 0]
+
+
+def edit_form(name):
+    return {"name": name, "city": 'Testville', "state": 'CA', "address": '1 Test Street', "phone": '',
+            "genres": 'Jazz', "facebook_link": '', "seeking_description": '', "image_link": '', "website": '',
+            "seeking_talent": 'false'}
+
+
+@needs_db
+def test_venue_page_is_cached_until_the_venue_is_edited(app, venue_id):
+    # the editing client carries a flashed message, which bypasses the cache
+    reader, writer = app.test_client(), app.test_client()
+    url = '/venues/%d' % venue_id
+    assert reader.get(url).headers['X-Cache'] == 'MISS'
+    assert reader.get(url).headers['X-Cache'] == 'HIT'
+    writer.post(url + '/edit', data=edit_form('Test Venue Renamed'))
+    page = reader.get(url)
+    assert page.headers['X-Cache'] == 'MISS'
+    assert b'Test Venue Renamed' in page.data
+
+
+@needs_db
+def test_streamed_listing_is_cached_once_sent(client, venue_id):
+    first = client.get('/venues', buffered=True)
+    assert first.headers['X-Cache'] == 'MISS'
+    again = client.get('/venues', buffered=True)
+    assert again.headers['X-Cache'] == 'HIT'
+    assert again.data == first.data
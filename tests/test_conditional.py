@@ -0,0 +1,31 @@
+import time
+
+from werkzeug.http import http_date
+
+from conftest import needs_db
+
+pytestmark = needs_db
+
+
+def test_unchanged_listing_is_not_modified(client):
+    etag = client.get('/artists', buffered=True).headers['ETag']
+    assert client.get('/artists', headers={"If-None-Match": etag}, buffered=True).status_code == 304
+
+
+def test_deleting_an_artist_changes_the_listing(client, artist_id):
+    first = client.get('/artists', buffered=True)
+    assert first.headers.get('Last-Modified') is None
+    client.delete('/artists/%d' % artist_id)
+    for headers in ({"If-None-Match": first.headers['ETag']}, {"If-Modified-Since": http_date(time.time() + 60)}):
+        again = client.get('/artists', headers=headers, buffered=True)
+        assert again.status_code == 200
+        assert b'Test Artist Qz' not in again.data
+
+
+def test_booking_a_show_changes_the_venue_page(client, venue_id, artist_id):
+    url = '/venues/%d' % venue_id
+    etag = client.get(url).headers['ETag']
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    client.post('/api/v1/shows', json={"shows": [
+        {"venue": 'test-venue-qz', "artist": 'test-artist-qz', "start_time": '2031-04-01T20:00:00Z'}]})
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 200
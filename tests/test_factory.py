@@ -0,0 +1,17 @@
+from app import create_app, name_index, page_cache
+
+
+def make_app(**config):
+    return create_app(dict({"SECRET_KEY": 'test', "SQLALCHEMY_DATABASE_URI": 'postgresql://localhost/unused'},
+                           **config))
+
+
+def test_every_app_keeps_its_own_state():
+    first = make_app(CACHE_TTL=60)
+    second = make_app(CACHE_TTL=5, CACHE_BACKEND=None)
+    with first.app_context():
+        assert page_cache.backend.ttl == 60
+        first_names = name_index('venues')
+    with second.app_context():
+        assert page_cache.backend is None
+        assert name_index('venues') is not first_names
@@ -0,0 +1,103 @@
+import json
+import os
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import (Column, DateTime, Integer, MetaData, String, Table, UniqueConstraint,
+                        create_engine, select)
+
+import importer
+from app import Artist, Venue
+from conftest import DATABASE_URL, needs_db
+
+# copy_insert needs Postgres (COPY, ON CONFLICT); these tests run in a
+# transaction that is rolled back.
+
+SEED = os.path.join(os.path.dirname(__file__), os.pardir, 'seed')
+START = datetime(2030, 5, 1, 20, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def conn():
+    engine = create_engine(DATABASE_URL)
+    with engine.connect() as conn:
+        transaction = conn.begin()
+        try:
+            yield conn
+        finally:
+            transaction.rollback()
+    engine.dispose()
+
+
+@pytest.fixture
+def shows(conn):
+    # shaped like the partitioned Shows: external_id is unique per start_time
+    table = Table('import_test_shows', MetaData(),
+                  Column('id', Integer, primary_key=True),
+                  Column('external_id', String),
+                  Column('start_time', DateTime(timezone=True), nullable=False),
+                  UniqueConstraint('external_id', 'start_time'),
+                  prefixes=['TEMPORARY'])
+    table.create(conn)
+    return table
+
+
+def stored(conn, table):
+    return conn.execute(select([table.c.external_id, table.c.start_time])
+                        .order_by(table.c.start_time)).fetchall()
+
+
+@needs_db
+def test_copy_insert_keeps_first_row_of_an_external_id(conn, shows):
+    rows = [{"external_id": 'p-1', "start_time": START},
+            {"external_id": 'p-1', "start_time": START + timedelta(days=1)},
+            {"external_id": 'p-2', "start_time": START + timedelta(days=2)}]
+    assert importer.copy_insert(conn, shows, rows) == 2
+    assert stored(conn, shows) == [('p-1', START), ('p-2', START + timedelta(days=2))]
+
+
+@needs_db
+def test_copy_insert_skips_external_ids_already_present(conn, shows):
+    importer.copy_insert(conn, shows, [{"external_id": 'p-1', "start_time": START}])
+    rows = [{"external_id": 'p-1', "start_time": START + timedelta(days=1)},
+            {"external_id": 'p-2', "start_time": START + timedelta(days=2)}]
+    assert importer.copy_insert(conn, shows, rows) == 1
+    assert stored(conn, shows) == [('p-1', START), ('p-2', START + timedelta(days=2))]
+
+
+@needs_db
+def test_copy_insert_keeps_every_row_without_external_id(conn, shows):
+    rows = [{"external_id": None, "start_time": START},
+            {"external_id": None, "start_time": START + timedelta(days=1)}]
+    assert importer.copy_insert(conn, shows, rows) == 2
+
+
+@needs_db
+def test_import_file_rejects_lines_that_are_not_json_objects(conn, shows, tmp_path):
+    path = tmp_path / 'shows.jsonl'
+    path.write_text('{"external_id": "p-1"}\n{"external_id": \n[1, 2]\n{"external_id": "p-2"}\n')
+
+    class Engine(object):
+        # batches run in savepoints of the test's transaction
+        @contextmanager
+        def begin(self):
+            with conn.begin_nested():
+                yield conn
+
+    def convert(batch, conn):
+        return [{"external_id": row["external_id"], "start_time": START + timedelta(days=i)}
+                for i, row in enumerate(batch)], []
+    assert importer.import_file(Engine(), shows, str(path), convert, echo=lambda message: None) == 2
+    rejected = [json.loads(line) for line in (tmp_path / 'shows.jsonl.rejected').read_text().splitlines()]
+    assert [r["reason"] for r in rejected] == ['bad JSON', 'not a JSON object']
+    assert rejected[1]["row"] == '[1, 2]'
+
+
+@pytest.mark.parametrize('table, seed, flag', [(Venue.__table__, 'venues.jsonl', 'seeking_talent'),
+                                               (Artist.__table__, 'artists.jsonl', 'seeking_venue')])
+def test_entity_converter_accepts_the_seed_rows(table, seed, flag):
+    rows = list(importer.read_rows(os.path.join(SEED, seed)))
+    values, rejected = importer.entity_converter(table, flags=(flag,))(rows, None)
+    assert rejected == []
+    assert len(values) == len(rows)
@@ -0,0 +1,38 @@
+import re
+
+from metrics import Histogram
+from conftest import needs_db
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram('t_seconds', 'Test.', (0.1, 1))
+    for value in (0.05, 0.5, 0.5, 5):
+        histogram.observe('main.index', value)
+    lines = histogram.expose().splitlines()
+    assert 't_seconds_bucket{endpoint="main.index",le="0.1"} 1' in lines
+    assert 't_seconds_bucket{endpoint="main.index",le="1.0"} 3' in lines
+    assert 't_seconds_bucket{endpoint="main.index",le="+Inf"} 4' in lines
+    assert 't_seconds_count{endpoint="main.index"} 4' in lines
+
+
+def observed(client, metric, endpoint):
+    page = client.get('/metrics').get_data(as_text=True)
+    found = re.search(r'^%s_count\{endpoint="%s"\} (\d+)$' % (metric, re.escape(endpoint)), page, re.M)
+    return int(found.group(1)) if found else 0
+
+
+@needs_db
+def test_requests_are_observed_per_endpoint(client, artist_id):
+    before = observed(client, 'fyyur_request_queries', 'main.show_artist')
+    client.get('/artists/%d' % artist_id)
+    assert observed(client, 'fyyur_request_queries', 'main.show_artist') == before + 1
+
+
+@needs_db
+def test_streamed_pages_are_observed_once_sent(client):
+    before = observed(client, 'fyyur_response_bytes', 'main.venues')
+    response = client.get('/venues')
+    assert observed(client, 'fyyur_response_bytes', 'main.venues') == before
+    response.get_data()
+    response.close()
+    assert observed(client, 'fyyur_response_bytes', 'main.venues') == before + 1
@@ -0,0 +1,58 @@
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import text
+
+from app import Shows, Venue, archive_show_partitions, create_show_partitions, db, show_partition_years
+from conftest import needs_db
+
+pytestmark = needs_db
+
+
+def add_show(venue_id, artist_id, start_time):
+    db.session.execute(Shows.__table__.insert(), {"venue_id": venue_id, "artist_id": artist_id,
+                                                  "start_time": start_time})
+    db.session.commit()
+
+
+def partition_of(venue_id):
+    # committed at once: the partition DDL waits for every open transaction
+    name = db.session.execute(text('SELECT tableoid::regclass::text FROM "Shows" WHERE venue_id = :v'),
+                              {"v": venue_id}).scalar()
+    db.session.commit()
+    return name
+
+
+def test_create_moves_the_years_shows_out_of_the_default_partition(app, venue_id, artist_id):
+    this = datetime.now(timezone.utc).year
+    year = max(show_partition_years(db.session) + [this]) + 1
+    start, end = datetime(year, 1, 1, tzinfo=timezone.utc), datetime(year + 1, 1, 1, tzinfo=timezone.utc)
+    if Shows.query.filter(Shows.start_time >= start, Shows.start_time < end).count():
+        pytest.skip('the database has shows in %d' % year)
+    add_show(venue_id, artist_id, datetime(year, 7, 1, 20, 0, tzinfo=timezone.utc))
+    assert partition_of(venue_id) == '"Shows_default"'
+    try:
+        assert create_show_partitions(year - this) == [year]
+        assert partition_of(venue_id) == '"Shows_%d"' % year
+    finally:
+        Shows.query.filter_by(venue_id=venue_id).delete()
+        db.session.execute(text('ALTER TABLE "Shows" DETACH PARTITION "Shows_%d"' % year))
+        db.session.execute(text('DROP TABLE IF EXISTS "Shows_%d"' % year))
+        db.session.commit()
+
+
+def test_archive_detaches_old_years_and_their_past_counts(app, venue_id, artist_id):
+    db.session.execute(text('CREATE TABLE "Shows_1990" PARTITION OF "Shows" '
+                            "FOR VALUES FROM ('1990-01-01 00:00+00') TO ('1991-01-01 00:00+00')"))
+    db.session.commit()
+    try:
+        add_show(venue_id, artist_id, datetime(1990, 7, 1, 20, 0, tzinfo=timezone.utc))
+        assert Venue.query.get(venue_id).past_shows_count == 1
+        db.session.commit()
+        assert archive_show_partitions(1991) == [1990]
+        assert Venue.query.get(venue_id).past_shows_count == 0
+        assert Shows.query.filter_by(venue_id=venue_id).count() == 0
+    finally:
+        db.session.rollback()
+        db.session.execute(text('DROP TABLE IF EXISTS archive."Shows_1990", "Shows_1990"'))
+        db.session.commit()
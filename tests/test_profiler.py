@@ -0,0 +1,19 @@
+import os
+
+from app import request_profiler
+from conftest import needs_db
+
+pytestmark = needs_db
+
+
+def test_a_request_with_a_valid_token_is_profiled(app, client, tmp_path):
+    app.config['PROFILE_DIR'] = str(tmp_path)
+    client.get('/', headers={"X-Profile": request_profiler.token()})
+    assert [name.split('.')[:2] for name in os.listdir(tmp_path)] == [['GET', 'root']]
+
+
+def test_requests_without_a_valid_token_are_not_profiled(app, client, tmp_path):
+    app.config['PROFILE_DIR'] = str(tmp_path)
+    client.get('/')
+    client.get('/', headers={"X-Profile": request_profiler.token() + 'x'})
+    assert os.listdir(tmp_path) == []
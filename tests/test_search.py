@@ -0,0 +1,22 @@
+import pytest
+
+from app import Artist, search
+from conftest import needs_db, scratch
+
+pytestmark = needs_db
+
+
+@pytest.fixture
+def artist_id(app):
+    yield from scratch(Artist, name='Zyxw Quevadoq', seeking_venue=False)
+
+
+@pytest.mark.parametrize('term', ['zyxw quev', 'ZYXW', 'evadoq', 'w q'])
+def test_search_finds_word_prefixes_and_substrings(app, artist_id, term):
+    with app.test_request_context():
+        assert artist_id in [row.id for row in search(Artist, term)["data"]]
+
+
+def test_search_ranks_word_matches_first(app, artist_id):
+    with app.test_request_context():
+        assert search(Artist, 'Zyxw')["data"][0].id == artist_id
@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import SeriesTooLong, ShowSeries, Shows, expand_series
+from conftest import needs_db
+
+START = datetime(2031, 6, 1, 20, 0, tzinfo=timezone.utc)
+
+
+def test_expand_series_lists_every_date():
+    assert expand_series('FREQ=WEEKLY;COUNT=3', START, 10) == [START + timedelta(weeks=w) for w in range(3)]
+
+
+@pytest.mark.parametrize('rule', ['FREQ=DAILY;COUNT=11', 'FREQ=DAILY'])
+def test_expand_series_refuses_more_than_the_limit(rule):
+    with pytest.raises(SeriesTooLong):
+        expand_series(rule, START, 10)
+
+
+def post_series(client, venue_id, artist_id, repeat, occurrences):
+    return client.post('/shows/create', data={"venue_id": venue_id, "artist_id": artist_id,
+                                              "start_time": START.isoformat(), "repeat": repeat,
+                                              "occurrences": occurrences})
+
+
+@needs_db
+def test_weekly_series_books_all_its_shows(client, venue_id, artist_id):
+    post_series(client, venue_id, artist_id, 'FREQ=WEEKLY', 4)
+    series = ShowSeries.query.filter_by(venue_id=venue_id).one()
+    assert series.rule == 'FREQ=WEEKLY;COUNT=4'
+    assert Shows.query.filter_by(venue_id=venue_id, series_id=series.id).count() == 4
+
+
+@needs_db
+@pytest.mark.parametrize('repeat, occurrences', [('FREQ=DAILY;COUNT=1000', 2), ('FREQ=WEEKLY', 10000)])
+def test_series_outside_the_form_rules_is_refused(client, venue_id, artist_id, repeat, occurrences):
+    post_series(client, venue_id, artist_id, repeat, occurrences)
+    assert Shows.query.filter_by(venue_id=venue_id).count() == 0
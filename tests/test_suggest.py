@@ -0,0 +1,19 @@
+from suggest import PrefixIndex
+
+
+def test_rebuild_leaves_out_names_beyond_the_cap():
+    index = PrefixIndex(max_entries=5)
+    index.rebuild([(1, 'The Musical Hop'), (2, 'Park Square'), (3, 'Jazz')])
+    assert len(index) == 5
+    assert index.lookup('pa') == [{"id": 2, "name": 'Park Square'}]
+    assert index.lookup('jazz') == []
+
+
+def test_add_leaves_out_a_name_that_does_not_fit():
+    index = PrefixIndex(max_entries=3)
+    index.rebuild([(1, 'Park Square')])
+    index.add(2, 'The Musical Hop')
+    assert len(index) == 2
+    assert index.lookup('hop') == []
+    index.add(3, 'Jazz')
+    assert index.lookup('jazz') == [{"id": 3, "name": 'Jazz'}]
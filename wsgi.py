@@ -0,0 +1,7 @@
+# WSGI entry point: gunicorn -c gunicorn.conf.py wsgi:app
+from app import compile_templates, create_app
+
+app = create_app()
+# gunicorn preloads this module in the master, so the forked workers share
+# the compiled templates instead of each compiling them on first use.
+compile_templates(app)